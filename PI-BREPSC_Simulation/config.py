@@ -1,5 +1,5 @@
 # config.py
-import pygame
+from geometry import Rect # 与 pygame.Rect 语义相同，但无需导入 pygame
 
 # --- Pygame 显示设置 ---
 SCREEN_WIDTH = 1200  # 适当增加宽度以显示更多信息
@@ -34,24 +34,59 @@ PATH_LOSS_D0_METERS = 1.0    # 参考距离 (米)
 SHADOW_FADING_SIGMA_DB = 4.0 # 阴影衰落标准差 (dB)
 BODY_SHADOWING_ATTENUATION_DB_MEAN = 10.0 # 人体遮挡平均衰减 (dB)
 BODY_SHADOWING_ATTENUATION_DB_STD = 3.0 # 人体遮挡衰减标准差 (dB)
+BODY_SHADOWING_PROBABILITY = 0.4 # 发生人体遮挡的概率
+BLE_PACKET_LOSS_PROBABILITY = 0.1 # 每帧每个扫描仪漏收某设备广播包的概率 (所有扫描仪同时漏收时该帧未检测到设备)
 # 简化的多普勒效应参数 (可选，如果行人朝向或背向扫描仪移动)
 DOPPLER_MAX_RSSI_SHIFT_DB = 2.0 # 最大RSSI变化量
 
 # --- 行人设置 ---
 PEDESTRIAN_RADIUS = 8
-PEDESTRIAN_SPEED_PIXELS_PER_FRAME = 1.5
+PEDESTRIAN_SPEED_PIXELS_PER_FRAME = 1.5 # 4.5 m/s (1.5 * FPS / PIXELS_PER_METER)
 # 运动状态判断阈值 (帧数)
 STATIONARY_FRAMES_SHORT = int(FPS * 0.5) # 短时静止 (0.5秒)
 STATIONARY_FRAMES_LONG = int(FPS * 2.0)  # 长时静止 (2秒)
 PEDESTRIAN_HISTORY_SIZE = 10 # 用于判断运动状态的位置历史记录大小
+# 人群运动: 按目的地缓存的流场 + 均匀邻域网格分离
+CROWD_FLOW_CELL_PIXELS = 10 # 流场网格大小 (像素)
+CROWD_OFF_ROUTE_COST = 20.0 # 流场中车道 (人行横道以外) 的通行代价倍数
+CROWD_SEPARATION_DISTANCE_PIXELS = PEDESTRIAN_RADIUS * 2 + 4 # 行人之间保持的最小中心距离
+CROWD_SEPARATION_GAIN = 0.5 # 每帧修正的重叠比例
+CROWD_SIDESTEP_RATIO = 1.0 # 迎面相遇时侧向让行位移与分离位移之比
+CROWD_MIN_STEP_PIXELS = 0.05 # 小于该值的速度视为静止 (避免密集人群中的微小抖动)
 
 # --- PI-BPRV (物理信息融合的感知与请求验证) 设置 ---
 # RSSI 阈值
 RSSI_VALID_RANGE_DBM = (-90, -20) # 有效RSSI范围
 RSSI_WAITING_THRESHOLD_DBM = -75  # 判断为可能等待的RSSI下限
+RSSI_HISTORY_FRAMES = int(FPS * 2) # 每个扫描仪的RSSI历史长度 (2秒)
+RSSI_STABILITY_MIN_DOF = 10 # 规则A2 (RSSI不稳定) 所需的最少自由度 (各扫描仪样本数减一之和)
+# 扫描范围裁剪：超出该距离的行人-扫描仪对不再逐帧计算
+# 链路预算距离 (平均RSSI低于有效下限，再加衰落余量) 在本路径损耗模型中约 1.8 km (模型没有参考距离处的损耗)，
+# 不能起到裁剪作用；实际扫描仪在街道上受车辆与人群遮挡，可靠接收距离约十几米，取两者中较小者
+# (在构造 RSU 时由 rsu_simulator.max_scan_range_meters() 计算，因此覆盖以下任一参数都会生效)
+RSU_RANGE_FADING_MARGIN_DB = 2 * SHADOW_FADING_SIGMA_DB # 为正向阴影衰落保留的余量 (dB)
+RSU_SCANNER_RANGE_METERS = 15.0 # 单个扫描仪的实际接收距离 (米)，按部署环境调整
+# RSSI 定位 (批量 Gauss-Newton 反演对数距离模型)
+LOCALIZATION_GN_ITERATIONS = 3 # 每帧迭代次数 (热启动后通常足够)
+LOCALIZATION_RSSI_SIGMA_DB = (SHADOW_FADING_SIGMA_DB**2 + BODY_SHADOWING_PROBABILITY * (BODY_SHADOWING_ATTENUATION_DB_MEAN**2 + BODY_SHADOWING_ATTENUATION_DB_STD**2)
+                              - (BODY_SHADOWING_PROBABILITY * BODY_SHADOWING_ATTENUATION_DB_MEAN)**2) ** 0.5 # 单次RSSI读数的总标准差 (dB)
+LOCALIZATION_CLIPPED_RSSI_WEIGHT = 0.1 # 被截断到有效范围边界的读数权重
+LOCALIZATION_PROCESS_NOISE_METERS = 0.1 # 每帧位置随机游走标准差 (m)
+LOCALIZATION_INITIAL_SIGMA_METERS = 10.0 # 新设备初始位置标准差 (m)
+LOCALIZATION_MAX_STEP_METERS = 5.0 # 单次迭代最大步长 (m)
+LOCALIZATION_SPEED_WINDOW_FRAMES = FPS * 2 # 由估计位置计算速度的时间窗口 (2秒；窗口越短，定位噪声造成的速度误差越大)
+LOCALIZATION_ACQUISITION_FRAMES = FPS # 新轨迹的捕获期 (1秒)：期间每帧额外加入过程噪声，避免估计被最初几帧错误线性化得到的信息锁住
+LOCALIZATION_ACQUISITION_NOISE_METERS = 1.0 # 捕获期内每帧额外的位置随机游走标准差 (m)
+LOCALIZATION_SPEED_WARMUP_FRAMES = FPS * 2 # 轨迹出现后这么多帧内的估计不用于速度 (仍在收敛)
+WAIT_AREA_TOLERANCE_SIGMA = 1.0 # 等待区判断时每侧放宽的定位标准差倍数 (RSU、嵌入式流程与布局覆盖分析共用)
+LOCALIZATION_SPEED_MAX_SIGMA_METERS = 1.5 # 定位标准差 (每轴) 超过该值的估计不用于速度 (如长时间滑行后)
+# 轨迹生命周期: 暂定 (tentative) -> 确认 (confirmed) -> 漏检时滑行 (coasting)，超时 (TTL) 后删除
+TRACK_CONFIRM_HITS = 3 # 暂定轨迹被检测到多少帧后确认
+TRACK_TENTATIVE_TTL_FRAMES = int(FPS * 0.25) # 暂定轨迹漏检多少帧后删除
+TRACK_COAST_TTL_FRAMES = int(FPS * 3) # 确认轨迹漏检多少帧后删除 (期间保留历史、意图与置信度)
 # 异常检测阈值
 RSSI_JUMP_THRESHOLD_DB = 25      # RSSI异常跳变阈值 (dB)
-MAX_SPEED_METERS_PER_SEC = 3.0   # 行人最大合理速度 (m/s) -> 用于运动学一致性
+MAX_SPEED_METERS_PER_SEC = 5.0   # 行人最大合理速度 (m/s) -> 用于运动学一致性 (须高于仿真行人速度 4.5 m/s)
 # 意图与置信度
 INTENT_PROB_INCREMENT = 0.15
 INTENT_PROB_DECREMENT = 0.08
@@ -74,27 +109,74 @@ PEDESTRIAN_WALK_TIME = int(FPS * 8)
 PEDESTRIAN_FLASH_TIME = int(FPS * 5) # "请勿通行" 闪烁时间
 ALL_RED_TIME = int(FPS * 2)
 
+# --- 嵌入式版本 (Embedded_Hardware_Version) 仿真设置 ---
+RSU_EMBEDDED_PROFILE = False # True: 由 int16/float32、固定容量状态表的嵌入式流程驱动TLC，并与全精度流程比较
+EMBEDDED_MAX_TRACKED_DEVICES = 64 # 逐设备状态表容量
+EMBEDDED_RSSI_WINDOW_FRAMES = 16 # RSSI环形缓冲长度 (帧)
+EMBEDDED_SPEED_WINDOW_FRAMES = 32 # 估计位置环形缓冲长度 (项)，用于速度估计
+EMBEDDED_SPEED_SAMPLE_STRIDE = 4 # 每隔多少帧存一个估计位置 (32 项 x 4 帧覆盖 LOCALIZATION_SPEED_WINDOW_FRAMES)
+EMBEDDED_HASH_ENTRY_BYTES = 8 # 设备哈希表每项字节数 (设备哈希 + 槽位号 + 链接)
+EMBEDDED_RAM_BUDGET_BYTES = 32 * 1024 # MCU 上可用于追踪表的RAM (字节)
+
+# --- KPI 在线统计设置 ---
+KPI_REPORT_INTERVAL_FRAMES = FPS * 60 # 周期性输出KPI摘要的间隔 (帧数, 0 表示只在结束时输出)
+KPI_HISTOGRAM_BINS = 100 # 直方图分箱数 (固定内存)
+KPI_WAIT_TIME_HIST_MAX_SEC = 120.0 # 等待时间直方图上限 (秒)
+
+# --- 场景设置 (无界面运行 / 参数扫描) ---
+DEFAULT_SCENARIO = {
+    "initial_west": 2, # 初始西侧行人数
+    "initial_east": 0, # 初始东侧行人数
+    "spawn_interval_sec": 0.0, # 周期性生成行人的间隔 (秒, 0 表示不生成)
+    "malicious_fraction": 0.0, # 新生成行人为恶意行为者的比例
+}
+
+# --- 命令行入口设置 ---
+STARTUP_BUDGET_MS = 1500 # 无界面运行从启动解释器到第一帧的时间预算 (毫秒)
+FRAME_TIME_BUDGET_MS = 1000 / 30 # 交互帧时间预算 (毫秒)：benchmark 中仿真一步加渲染一帧的平均耗时 (30 fps)
+
+# --- 仿真快照 / 分支设置 ---
+SNAPSHOT_DEFAULT_PATH = "simulation_snapshot.bin" # 交互模式下 F5 保存 / F9 恢复的快照文件
+SNAPSHOT_COMPRESSION_LEVEL = 1 # zlib 压缩级别 (1 最快)
+
+# --- 无界面运行结果缓存设置 ---
+RESULT_CACHE_ENABLED = True # headless / sweep 默认复用相同参数、场景、种子与代码版本的运行结果
+RESULT_CACHE_DIR = ".result_cache" # 相对于仿真目录
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024 # 超过后按最近最少使用淘汰
+RESULT_CACHE_EVICT_TARGET_FRACTION = 0.8 # 淘汰时删到上限的该比例以下，使目录扫描不会在每次写入时发生
+
+# --- 扫描仪布局覆盖分析 / 布局搜索设置 ---
+COVERAGE_GRID_STEP_PIXELS = 10 # 覆盖图网格步长 (像素)
+COVERAGE_ROI_MARGIN_METERS = 5.0 # 分析区域: 等待区向外扩展的距离 (扩展部分中非车道的格子视为路过行人区域)
+COVERAGE_MIN_DETECTION_PROBABILITY = 0.99 # 单帧检测概率达到该值的格子计为 "覆盖"
+COVERAGE_CANDIDATE_STEP_PIXELS = 25 # 候选安装位置的网格步长 (像素)
+COVERAGE_SEARCH_LAYOUTS = 4096 # 默认搜索的随机布局数量
+COVERAGE_SEARCH_BATCH = 64 # 每批向量化评估的布局数量
+
+# --- 离屏帧导出设置 ---
+EXPORT_FORMAT = "tga" # 图像序列: "png", "tga", "bmp", "jpg"；或 "raw" (单个原始像素流文件，可管道给 ffmpeg)
+EXPORT_FRAME_STRIDE = 2 # 每隔多少个仿真帧导出一帧 (2 即 30 fps)
+EXPORT_RESOLUTION = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2) # 导出分辨率 (与屏幕尺寸不同时缩放)
+EXPORT_QUEUE_FRAMES = 8 # 写盘线程与仿真线程之间的可复用帧缓冲数量；缓冲用尽时丢弃该帧而非阻塞仿真
+
 # --- 仿真界面元素位置/尺寸 ---
 INTERSECTION_CENTER_X = SCREEN_WIDTH // 2
 INTERSECTION_CENTER_Y = SCREEN_HEIGHT // 2
 ROAD_WIDTH = 100
 CROSSWALK_WIDTH = 20
 # 主干道 (垂直)
-V_ROAD_RECT = pygame.Rect(INTERSECTION_CENTER_X - ROAD_WIDTH // 2, 0, ROAD_WIDTH, SCREEN_HEIGHT)
+V_ROAD_RECT = Rect(INTERSECTION_CENTER_X - ROAD_WIDTH // 2, 0, ROAD_WIDTH, SCREEN_HEIGHT)
 # 人行横道 (东西向)
-H_CROSSWALK_RECT_NORTH = pygame.Rect(V_ROAD_RECT.left - ROAD_WIDTH, INTERSECTION_CENTER_Y - ROAD_WIDTH // 2 - CROSSWALK_WIDTH, ROAD_WIDTH*2 + V_ROAD_RECT.width, CROSSWALK_WIDTH) # 上方人行道，延伸更宽
-H_CROSSWALK_RECT_SOUTH = pygame.Rect(V_ROAD_RECT.left - ROAD_WIDTH, INTERSECTION_CENTER_Y + ROAD_WIDTH // 2, ROAD_WIDTH*2 + V_ROAD_RECT.width, CROSSWALK_WIDTH) # 下方人行道
+H_CROSSWALK_RECT_NORTH = Rect(V_ROAD_RECT.left - ROAD_WIDTH, INTERSECTION_CENTER_Y - ROAD_WIDTH // 2 - CROSSWALK_WIDTH, ROAD_WIDTH*2 + V_ROAD_RECT.width, CROSSWALK_WIDTH) # 上方人行道，延伸更宽
+H_CROSSWALK_RECT_SOUTH = Rect(V_ROAD_RECT.left - ROAD_WIDTH, INTERSECTION_CENTER_Y + ROAD_WIDTH // 2, ROAD_WIDTH*2 + V_ROAD_RECT.width, CROSSWALK_WIDTH) # 下方人行道
 # 示例等待区域 (矩形)
-WAIT_AREA_WEST = pygame.Rect(H_CROSSWALK_RECT_NORTH.left, H_CROSSWALK_RECT_NORTH.top, ROAD_WIDTH, H_CROSSWALK_RECT_SOUTH.bottom - H_CROSSWALK_RECT_NORTH.top)
-WAIT_AREA_EAST = pygame.Rect(V_ROAD_RECT.right, H_CROSSWALK_RECT_NORTH.top, ROAD_WIDTH, H_CROSSWALK_RECT_SOUTH.bottom - H_CROSSWALK_RECT_NORTH.top)
+WAIT_AREA_WEST = Rect(H_CROSSWALK_RECT_NORTH.left, H_CROSSWALK_RECT_NORTH.top, ROAD_WIDTH, H_CROSSWALK_RECT_SOUTH.bottom - H_CROSSWALK_RECT_NORTH.top)
+WAIT_AREA_EAST = Rect(V_ROAD_RECT.right, H_CROSSWALK_RECT_NORTH.top, ROAD_WIDTH, H_CROSSWALK_RECT_SOUTH.bottom - H_CROSSWALK_RECT_NORTH.top)
 
 
 # 字体
 FONT_SIZE_SMALL = 18
 FONT_SIZE_MEDIUM = 24
 FONT_SIZE_LARGE = 30
-# 使用 Pygame 的默认字体或指定一个已安装的字体路径
-try:
-    DEFAULT_FONT_NAME = pygame.font.get_default_font()
-except:
-    DEFAULT_FONT_NAME = "arial" # 备用
\ No newline at end of file
+# 使用 Pygame 的默认字体 (None) 或指定一个已安装的字体路径
+DEFAULT_FONT_NAME = None
\ No newline at end of file
@@ -0,0 +1,196 @@
+# crowd_motion.py
+import heapq
+import math
+import numpy as np
+from config import *
+from spatial_grid import neighbor_pairs
+
+# 流场目的地: 两侧等待区
+FLOW_DESTINATIONS = {
+    "WAIT_AREA_WEST": WAIT_AREA_WEST,
+    "WAIT_AREA_EAST": WAIT_AREA_EAST,
+}
+
+_NEIGHBOR_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)] # (行, 列)
+
+def walkable_grid(cell_px):
+    """可步行格子 (rows, cols)：车道以外的区域与人行横道，按格子中心判断"""
+    rows = int(math.ceil(SCREEN_HEIGHT / cell_px))
+    cols = int(math.ceil(SCREEN_WIDTH / cell_px))
+    cx, cy = np.meshgrid((np.arange(cols) + 0.5) * cell_px, (np.arange(rows) + 0.5) * cell_px)
+
+    def in_rect(rect):
+        return (cx >= rect.left) & (cx < rect.right) & (cy >= rect.top) & (cy < rect.bottom)
+
+    return ~in_rect(V_ROAD_RECT) | in_rect(H_CROSSWALK_RECT_NORTH) | in_rect(H_CROSSWALK_RECT_SOUTH)
+
+def _cells_at(positions, cell_px, rows, cols):
+    """positions: (N,2) 像素坐标 -> 所在格子的 (行, 列) 下标 (超出画面的位置取边缘格子)"""
+    c = np.clip((positions[:, 0] // cell_px).astype(int), 0, cols - 1)
+    r = np.clip((positions[:, 1] // cell_px).astype(int), 0, rows - 1)
+    return r, c
+
+class FlowField:
+    """
+    到某个目的地区域的流场：在网格上用 Dijkstra 求各格子到目的地的通行代价 (车道上代价更高，
+    行人只会经人行横道过街)，每个格子保存指向代价最低邻格的单位方向。目的地格子方向为零 (到达后停下)。
+    """
+
+    def __init__(self, goal_rect, cell_px=None):
+        if cell_px is None:
+            cell_px = CROWD_FLOW_CELL_PIXELS
+        self.cell_px = cell_px
+        self.rows = int(math.ceil(SCREEN_HEIGHT / cell_px))
+        self.cols = int(math.ceil(SCREEN_WIDTH / cell_px))
+        centers_x = (np.arange(self.cols) + 0.5) * cell_px
+        centers_y = (np.arange(self.rows) + 0.5) * cell_px
+        cx, cy = np.meshgrid(centers_x, centers_y)
+        self.walkable = walkable_grid(cell_px)
+        cost = np.where(self.walkable, 1.0, CROWD_OFF_ROUTE_COST)
+        # 目的地格子: 行人圆完全位于目的地区域内的位置 (与 Pedestrian.is_at_wait_area 的判断一致)
+        inset = PEDESTRIAN_RADIUS + 1
+        goal = ((cx >= goal_rect.left + inset) & (cx < goal_rect.right - inset) &
+                (cy >= goal_rect.top + inset) & (cy < goal_rect.bottom - inset))
+        if not goal.any(): # 目的地区域比行人还小时退化为区域中心所在格子
+            goal[min(int(goal_rect.centery // cell_px), self.rows - 1), min(int(goal_rect.centerx // cell_px), self.cols - 1)] = True
+        self.goal = goal
+        self.cost_to_goal = self._dijkstra(cost, goal)
+        self.direction = self._descent_directions(self.cost_to_goal, goal)
+
+    def _dijkstra(self, cost, goal):
+        rows, cols = cost.shape
+        dist = np.full(rows * cols, np.inf)
+        flat_cost = cost.ravel()
+        heap = []
+        for idx in np.flatnonzero(goal.ravel()):
+            dist[idx] = 0.0
+            heap.append((0.0, int(idx)))
+        heapq.heapify(heap)
+        steps = [(dr, dc, math.hypot(dr, dc)) for dr, dc in _NEIGHBOR_OFFSETS]
+        while heap:
+            d, idx = heapq.heappop(heap)
+            if d > dist[idx]:
+                continue
+            r, c = divmod(idx, cols)
+            for dr, dc, length in steps:
+                nr, nc = r + dr, c + dc
+                if 0 <= nr < rows and 0 <= nc < cols:
+                    nidx = nr * cols + nc
+                    nd = d + length * 0.5 * (flat_cost[idx] + flat_cost[nidx])
+                    if nd < dist[nidx]:
+                        dist[nidx] = nd
+                        heapq.heappush(heap, (nd, nidx))
+        return dist.reshape(rows, cols)
+
+    @staticmethod
+    def _descent_directions(dist, goal):
+        rows, cols = dist.shape
+        padded = np.pad(dist, 1, constant_values=np.inf)
+        neighbor_dist = np.stack([padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols] for dr, dc in _NEIGHBOR_OFFSETS])
+        best = np.argmin(neighbor_dist, axis=0)
+        offsets = np.array([(dc, dr) for dr, dc in _NEIGHBOR_OFFSETS], dtype=float) # (x, y)
+        offsets /= np.linalg.norm(offsets, axis=1, keepdims=True)
+        direction = offsets[best]
+        direction[goal] = 0.0
+        return direction
+
+    def directions_at(self, positions):
+        """positions: (N,2) 像素坐标 -> (N,2) 单位方向 (目的地内为零)"""
+        return self.direction[_cells_at(positions, self.cell_px, self.rows, self.cols)]
+
+    def walkable_at(self, positions):
+        """positions: (N,2) 像素坐标 -> (N,) 是否位于可步行格子"""
+        return self.walkable[_cells_at(positions, self.cell_px, self.rows, self.cols)]
+
+
+# 流场只依赖布局，按 (目的地, 网格大小, 车道代价) 缓存在模块中 (不随仿真快照序列化)
+_flow_field_cache = {}
+
+def get_flow_field(destination_key):
+    key = (destination_key, CROWD_FLOW_CELL_PIXELS, CROWD_OFF_ROUTE_COST)
+    field = _flow_field_cache.get(key)
+    if field is None:
+        field = _flow_field_cache[key] = FlowField(FLOW_DESTINATIONS[destination_key])
+    return field
+
+def prepare_flow_fields():
+    """预先构建所有目的地的流场 (Simulation 初始化与快照恢复时调用，运行中途不会因首次使用而停顿)"""
+    for destination_key in FLOW_DESTINATIONS:
+        get_flow_field(destination_key)
+
+def off_route_pedestrians(pedestrians_list):
+    """位于车道上且不在人行横道内的行人 (人群运动不应产生这种情况)"""
+    if not pedestrians_list:
+        return []
+    positions = np.array([ped.pos for ped in pedestrians_list], dtype=float).reshape(-1, 2)
+    walkable = get_flow_field(next(iter(FLOW_DESTINATIONS))).walkable_at(positions)
+    return [ped for ped, ok in zip(pedestrians_list, walkable) if not ok]
+
+def _limit_speed(velocity):
+    """限制在行人最大速度以内，过小的速度视为静止"""
+    speed = np.sqrt(np.einsum('ij,ij->i', velocity, velocity))
+    scale = np.where(speed > PEDESTRIAN_SPEED_PIXELS_PER_FRAME, PEDESTRIAN_SPEED_PIXELS_PER_FRAME / np.maximum(speed, 1e-12), 1.0)
+    scale[speed < CROWD_MIN_STEP_PIXELS] = 0.0
+    return velocity * scale[:, None]
+
+def plan_crowd_velocities(pedestrians_list):
+    """
+    计算所有行人本帧的速度 (像素/帧)：
+    目标速度来自流场 (ped.flow_destination) 或原有的逐点路径，再叠加与邻近行人的分离位移，
+    限制在行人最大速度以内。邻域查询使用均匀网格，每帧 O(N)。
+    位于可步行格子上的行人不会被推到或走到车道上 (否则分离推挤会使行人滞留在车道上，流场的车道代价无法把行人拉回)。
+    """
+    n = len(pedestrians_list)
+    if n == 0:
+        return []
+    desired = np.zeros((n, 2))
+    rows_by_destination = {}
+    for row, ped in enumerate(pedestrians_list):
+        if ped.flow_destination:
+            rows_by_destination.setdefault(ped.flow_destination, []).append(row)
+        elif ped.path:
+            ped._calculate_velocity_to_next_target() # 可能在到达路径点时对齐位置
+            desired[row] = ped.current_velocity
+        # 没有路径也没有目的地的行人原地站立 (只受分离位移影响)
+    positions = np.array([ped.pos for ped in pedestrians_list], dtype=float).reshape(n, 2)
+    for destination_key, rows in rows_by_destination.items():
+        desired[rows] = get_flow_field(destination_key).directions_at(positions[rows]) * PEDESTRIAN_SPEED_PIXELS_PER_FRAME
+
+    # 分离: 每对过近的行人各自沿连线退开重叠量的一部分
+    separation = np.zeros((n, 2))
+    i_idx, j_idx = neighbor_pairs(positions, CROWD_SEPARATION_DISTANCE_PIXELS)
+    if len(i_idx):
+        diff = positions[i_idx] - positions[j_idx]
+        dist = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        coincident = dist < 1e-6
+        if coincident.any(): # 完全重合时按编号给出确定的分离方向
+            angle = (i_idx[coincident] - j_idx[coincident]) * 2.399963
+            diff[coincident] = np.stack([np.cos(angle), np.sin(angle)], axis=1)
+            dist[coincident] = 1.0
+        push = (0.5 * CROWD_SEPARATION_GAIN * (CROWD_SEPARATION_DISTANCE_PIXELS - dist) / dist)[:, None] * diff
+        # 迎面相遇时分离位移与目标速度正好抵消会僵持：正朝邻居走的行人额外向侧面 (同一旋转方向) 让开
+        heading_into = np.einsum('ij,ij->i', desired[i_idx], diff) < 0
+        sidestep = np.stack([-push[:, 1], push[:, 0]], axis=1) * CROWD_SIDESTEP_RATIO
+        push += np.where(heading_into[:, None], sidestep, 0.0)
+        separation[:, 0] = np.bincount(i_idx, weights=push[:, 0], minlength=n)
+        separation[:, 1] = np.bincount(i_idx, weights=push[:, 1], minlength=n)
+
+    velocity = _limit_speed(desired + separation)
+
+    # 本帧位移会把可步行格子上的行人带到车道上时 (分离/侧向让行的推挤，或流场沿对角线切过人行横道端部的车道角)，
+    # 依次尝试: 去掉分离位移的 y 分量、x 分量、只保留目标速度、目标速度只沿 x 或 y 轴 (沿边缘滑动)
+    field = get_flow_field(next(iter(FLOW_DESTINATIONS)))
+    rows = np.flatnonzero(field.walkable_at(positions) & ~field.walkable_at(positions + velocity))
+    if len(rows):
+        sep, want = separation[rows], desired[rows]
+        candidates = [want + sep * (1.0, 0.0), want + sep * (0.0, 1.0), want, want * (1.0, 0.0), want * (0.0, 1.0)]
+        resolved = np.zeros(len(rows), dtype=bool)
+        for candidate in candidates:
+            candidate = _limit_speed(candidate)
+            ok = ~resolved & field.walkable_at(positions[rows] + candidate)
+            velocity[rows[ok]] = candidate[ok]
+            resolved |= ok
+        # 都不可行时只剩流场认为必须经过车道的情况，保留目标速度
+        velocity[rows[~resolved]] = _limit_speed(want[~resolved])
+    return velocity.tolist()
+
@@ -0,0 +1,151 @@
+# frame_exporter.py
+import os
+import queue
+import threading
+import time
+import pygame
+from config import *
+from scene_renderer import render_scene
+from simulation_core import quiet_stdout
+
+IMAGE_SEQUENCE_FORMATS = ("png", "tga", "bmp", "jpg")
+RAW_FORMAT = "raw"
+
+class FrameExporter:
+    """
+    离屏帧导出：仿真线程把已渲染的场景缩放/复制到一个空闲的可复用 Surface 中，交给后台写盘线程。
+    空闲 Surface 池与待写队列都是有界的；池用尽 (写盘跟不上) 时丢弃该帧并计数，仿真线程从不等待磁盘 I/O。
+    图像序列写入 output_path 目录 (frame_000000.tga ...)；"raw" 格式把 RGB24 像素按帧连续写入 output_path 文件。
+    """
+
+    def __init__(self, output_path, fmt=None, resolution=None, frame_stride=None, queue_frames=None):
+        if fmt is None:
+            fmt = EXPORT_FORMAT
+        if resolution is None:
+            resolution = EXPORT_RESOLUTION
+        if frame_stride is None:
+            frame_stride = EXPORT_FRAME_STRIDE
+        if queue_frames is None:
+            queue_frames = EXPORT_QUEUE_FRAMES
+        if fmt not in IMAGE_SEQUENCE_FORMATS and fmt != RAW_FORMAT:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        self.output_path = output_path
+        self.fmt = fmt
+        self.resolution = (int(resolution[0]), int(resolution[1]))
+        self.frame_stride = max(1, int(frame_stride))
+
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = 0
+        self.error = None
+
+        if fmt == RAW_FORMAT:
+            out_dir = os.path.dirname(os.path.abspath(output_path))
+            os.makedirs(out_dir, exist_ok=True)
+            self._raw_file = open(output_path, "wb")
+        else:
+            os.makedirs(output_path, exist_ok=True)
+            self._raw_file = None
+
+        self._free_buffers = queue.Queue()
+        for _ in range(max(1, int(queue_frames))):
+            self._free_buffers.put(pygame.Surface(self.resolution, depth=32))
+        self._pending = queue.Queue() # 最多 queue_frames 个元素 (受空闲池大小限制)
+        self._writer = threading.Thread(target=self._writer_loop, name="FrameExporterWriter", daemon=True)
+        self._writer.start()
+
+    def wants_frame(self, frame_index):
+        """帧抽取：只有需要导出的帧才值得渲染"""
+        return frame_index % self.frame_stride == 0
+
+    def submit(self, scene_surface):
+        """仿真线程调用：非阻塞地提交一帧，返回是否被接受"""
+        if self.error is not None:
+            raise RuntimeError("Frame export failed") from self.error
+        try:
+            buf = self._free_buffers.get_nowait()
+        except queue.Empty:
+            self.frames_dropped += 1
+            return False
+        if scene_surface.get_size() == self.resolution:
+            buf.blit(scene_surface, (0, 0))
+        else:
+            pygame.transform.smoothscale(scene_surface, self.resolution, buf)
+        self._pending.put((self.frames_submitted, buf))
+        self.frames_submitted += 1
+        return True
+
+    def _writer_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            index, buf = item
+            try:
+                if self.error is None:
+                    if self._raw_file is not None:
+                        data = pygame.image.tobytes(buf, "RGB")
+                        self._raw_file.write(data)
+                        self.bytes_written += len(data)
+                    else:
+                        path = os.path.join(self.output_path, f"frame_{index:06d}.{self.fmt}")
+                        pygame.image.save(buf, path)
+                        self.bytes_written += os.path.getsize(path)
+                    self.frames_written += 1
+            except Exception as e: # 写盘错误在仿真线程下一次 submit / close 时抛出
+                self.error = e
+            finally:
+                self._free_buffers.put(buf)
+
+    def close(self):
+        """等待写盘线程写完队列中的帧；返回导出统计"""
+        self._pending.put(None)
+        self._writer.join()
+        if self._raw_file is not None:
+            self._raw_file.close()
+        if self.error is not None:
+            raise RuntimeError("Frame export failed") from self.error
+        return self.stats()
+
+    def stats(self):
+        return {
+            "format": self.fmt,
+            "resolution": self.resolution,
+            "frame_stride": self.frame_stride,
+            "output_fps": FPS / self.frame_stride,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "bytes_written": self.bytes_written,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def export_simulation(sim, num_frames, exporter, selected_pedestrian_id=None, quiet=True):
+    """
+    运行 num_frames 帧并导出；只渲染被抽取的帧。返回 exporter 统计，附加耗时信息。
+    selected_pedestrian_id 决定调试面板显示哪个行人 (默认取第一个行人，与交互窗口一致)。
+    """
+    if selected_pedestrian_id is None and sim.pedestrians_list:
+        selected_pedestrian_id = sim.pedestrians_list[0].id
+    scene = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), depth=32)
+
+    t0 = time.perf_counter()
+    with quiet_stdout(quiet):
+        for _ in range(num_frames):
+            sim.step()
+            if exporter.wants_frame(sim.frame - 1):
+                render_scene(scene, sim, selected_pedestrian_id)
+                exporter.submit(scene)
+    sim_seconds = time.perf_counter() - t0
+    stats = exporter.close()
+    stats["sim_thread_sec"] = sim_seconds
+    stats["total_sec"] = time.perf_counter() - t0
+    stats["scenario_sec"] = num_frames / FPS
+    return stats
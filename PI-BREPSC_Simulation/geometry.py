@@ -0,0 +1,36 @@
+# geometry.py
+
+class Rect(tuple):
+    """
+    轻量的整数矩形 (x, y, w, h)，语义与 pygame.Rect 一致 (坐标取整、右/下边界不含)。
+    用于 config 与仿真逻辑，使无界面运行时不必导入 pygame；作为 4 元组可直接传给 pygame.draw.rect / pygame.Rect。
+    """
+    __slots__ = ()
+
+    def __new__(cls, x, y, w, h):
+        return super().__new__(cls, (int(x), int(y), int(w), int(h)))
+
+    x = left = property(lambda self: self[0])
+    y = top = property(lambda self: self[1])
+    width = w = property(lambda self: self[2])
+    height = h = property(lambda self: self[3])
+    right = property(lambda self: self[0] + self[2])
+    bottom = property(lambda self: self[1] + self[3])
+    centerx = property(lambda self: self[0] + self[2] // 2)
+    centery = property(lambda self: self[1] + self[3] // 2)
+    center = property(lambda self: (self.centerx, self.centery))
+
+    def inflate(self, dx, dy):
+        dx, dy = int(dx), int(dy)
+        return Rect(self[0] - dx // 2, self[1] - dy // 2, self[2] + dx, self[3] + dy)
+
+    def collidepoint(self, pos):
+        px, py = int(pos[0]), int(pos[1]) # 与 pygame 一致，点坐标取整
+        return self.left <= px < self.right and self.top <= py < self.bottom
+
+    def contains(self, other):
+        return (self.left <= other[0] < self.right and self.top <= other[1] < self.bottom and
+                other[0] + other[2] <= self.right and other[1] + other[3] <= self.bottom)
+
+    def __repr__(self):
+        return f"<Rect({self[0]}, {self[1]}, {self[2]}, {self[3]})>"
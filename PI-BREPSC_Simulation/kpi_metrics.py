@@ -0,0 +1,199 @@
+# kpi_metrics.py
+import math
+from config import *
+
+class StreamingHistogram:
+    """固定分箱的流式直方图：内存与样本数量无关，分位数由分箱线性插值近似"""
+
+    def __init__(self, low, high, num_bins):
+        self.low = float(low)
+        self.high = float(high)
+        self.num_bins = int(num_bins)
+        self.bin_width = (self.high - self.low) / self.num_bins
+        self.bins = [0] * self.num_bins
+        self.underflow = 0 # 低于 low 的样本数
+        self.overflow = 0  # 不低于 high 的样本数
+        self.count = 0
+        self.total = 0.0
+        self.min_value = math.inf
+        self.max_value = -math.inf
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        self.total += value
+        self.min_value = min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+        if value < self.low:
+            self.underflow += 1
+        elif value >= self.high:
+            self.overflow += 1
+        else:
+            self.bins[int((value - self.low) / self.bin_width)] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """近似分位数 (0 <= q <= 1)；落在范围外的样本以观测到的 min/max 代替"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = self.underflow
+        if rank <= seen:
+            return self.min_value
+        for i, c in enumerate(self.bins):
+            if c and rank <= seen + c:
+                lo = self.low + i * self.bin_width
+                return min(max(lo + (rank - seen) / c * self.bin_width, self.min_value), self.max_value)
+            seen += c
+        return self.max_value
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max_value if self.count else 0.0,
+        }
+
+
+class KPICollector:
+    """
+    在线统计仿真结果指标 (KPI)。每帧调用一次 observe_frame，只保存计数器、固定大小的直方图
+    以及当前仍在等待的行人，不保留逐事件日志，因此内存不随运行时长增长。
+    """
+
+    def __init__(self, report_interval_frames=None):
+        if report_interval_frames is None:
+            report_interval_frames = KPI_REPORT_INTERVAL_FRAMES
+        self.report_interval_frames = report_interval_frames # 0 表示只在结束时输出
+        self.frames = 0
+        self.vehicle_green_frames = 0
+
+        # 相位计数: 进入各相位的次数
+        self.phase_counts = {}
+        self._last_vehicle_phase = None
+        self._last_pedestrian_phase = None
+
+        # 等待时间: ped.id -> 进入等待区的帧号 (只保存当前在等待区的行人)
+        self._wait_entry_frame = {}
+        self.wait_time_sec = StreamingHistogram(0.0, KPI_WAIT_TIME_HIST_MAX_SEC, KPI_HISTOGRAM_BINS)
+
+        # 请求服务统计
+        self.service_requests = 0
+        self.false_requests = 0 # 请求者在请求时实际不在等待区 (或为恶意行为者) 的服务周期
+        self.blocked_anomalous_requests = 0 # 按下按钮但被RSU识别为异常而过滤的次数
+        self._anomalous_requesters = set() # 当前被过滤的请求者 (只保存仍处于异常状态的行人)
+        self.confidence_at_service = StreamingHistogram(0.0, 1.0, KPI_HISTOGRAM_BINS)
+
+        # 轨迹生命周期 (取自 RSU 的 TrackManager 累计计数)
+        self.track_reacquisitions = 0 # 漏检后在超时前恢复的轨迹
+        self.tracks_expired = 0
+
+    def _count_phase(self, prefix, phase):
+        key = f"{prefix}:{phase}"
+        self.phase_counts[key] = self.phase_counts.get(key, 0) + 1
+
+    def observe_frame(self, pedestrians_list, rsu_unit, tlc_unit, rsu_request_priority, request_source=None):
+        """
+        在 TLC 更新之后调用，记录当前帧。
+        request_source 为发出本帧请求的流程 (RSU 或嵌入式 RSU，需提供 last_request_ped_id 与 get_device_state)，
+        默认为 rsu_unit。
+        """
+        request_source = request_source or rsu_unit
+        self.frames += 1
+        self.track_reacquisitions = rsu_unit.track_manager.reacquired_count
+        self.tracks_expired = rsu_unit.track_manager.expired_count
+        if tlc_unit.vehicle_phase == "green":
+            self.vehicle_green_frames += 1
+
+        vehicle_phase_changed = tlc_unit.vehicle_phase != self._last_vehicle_phase
+        pedestrian_phase_changed = tlc_unit.pedestrian_phase != self._last_pedestrian_phase
+        if vehicle_phase_changed:
+            self._count_phase("V", tlc_unit.vehicle_phase)
+        if pedestrian_phase_changed:
+            self._count_phase("P", tlc_unit.pedestrian_phase)
+
+        # 车辆绿灯 -> 黄灯 表示开始服务一个行人请求
+        if vehicle_phase_changed and tlc_unit.vehicle_phase == "yellow" and rsu_request_priority > 0:
+            self.service_requests += 1
+            requester_id = request_source.last_request_ped_id
+            requester = next((p for p in pedestrians_list if p.id == requester_id), None)
+            # 以真实位置判断：请求者不在任何等待区 (如定位误差导致的路过行人请求) 即为误请求
+            if (requester is None or requester.is_malicious or
+                    not (WAIT_AREA_WEST.collidepoint(requester.pos) or WAIT_AREA_EAST.collidepoint(requester.pos))):
+                self.false_requests += 1
+            requester_data = request_source.get_device_state(requester_id) if requester_id is not None else None
+            if requester_data:
+                self.confidence_at_service.add(requester_data["confidence"])
+
+        walk_started = pedestrian_phase_changed and tlc_unit.pedestrian_phase == "walk"
+        for ped in pedestrians_list:
+            # 等待时间: 从进入等待区到行人绿灯 (walk)
+            if ped.is_at_wait_area:
+                if walk_started and ped.id in self._wait_entry_frame:
+                    self.wait_time_sec.add((self.frames - self._wait_entry_frame.pop(ped.id)) / FPS)
+                elif not walk_started and ped.id not in self._wait_entry_frame:
+                    self._wait_entry_frame[ped.id] = self.frames
+            elif ped.id in self._wait_entry_frame: # 未等到 walk 就离开了等待区
+                del self._wait_entry_frame[ped.id]
+
+            # 被过滤的异常请求 (按上升沿计数)
+            ped_data = rsu_unit.pedestrian_tracking_data.get(ped.id)
+            if ped.is_requesting_button_press and ped_data and ped_data["is_anomalous"]:
+                if ped.id not in self._anomalous_requesters:
+                    self._anomalous_requesters.add(ped.id)
+                    self.blocked_anomalous_requests += 1
+            else:
+                self._anomalous_requesters.discard(ped.id)
+
+        # 清理已离开仿真的行人
+        if len(self._wait_entry_frame) > len(pedestrians_list) or len(self._anomalous_requesters) > len(pedestrians_list):
+            current_ids = {p.id for p in pedestrians_list}
+            self._wait_entry_frame = {k: v for k, v in self._wait_entry_frame.items() if k in current_ids}
+            self._anomalous_requesters &= current_ids
+
+        self._last_vehicle_phase = tlc_unit.vehicle_phase
+        self._last_pedestrian_phase = tlc_unit.pedestrian_phase
+
+        if self.report_interval_frames and self.frames % self.report_interval_frames == 0:
+            print(self.format_summary())
+
+    def summary(self):
+        return {
+            "sim_time_sec": self.frames / FPS,
+            "frames": self.frames,
+            "pedestrian_wait_time_sec": self.wait_time_sec.summary(),
+            "service_requests": self.service_requests,
+            "false_requests": self.false_requests,
+            "false_request_rate": self.false_requests / self.service_requests if self.service_requests else 0.0,
+            "blocked_anomalous_requests": self.blocked_anomalous_requests,
+            "phase_counts": dict(self.phase_counts),
+            "vehicle_green_utilization": self.vehicle_green_frames / self.frames if self.frames else 0.0,
+            "confidence_at_service": self.confidence_at_service.summary(),
+            "track_reacquisitions": self.track_reacquisitions,
+            "tracks_expired": self.tracks_expired,
+        }
+
+    def format_summary(self):
+        return format_kpi_summary(self.summary())
+
+
+def format_kpi_summary(s):
+    """把 KPICollector.summary() 的结果格式化为多行文本 (也用于结果缓存中读出的摘要)"""
+    wait = s["pedestrian_wait_time_sec"]
+    conf = s["confidence_at_service"]
+    phases = ", ".join(f"{k}={v}" for k, v in sorted(s["phase_counts"].items()))
+    return "\n".join([
+        f"KPI @ {s['sim_time_sec']:.1f}s sim time ({s['frames']} frames)",
+        f"  Ped wait (s): n={wait['count']} mean={wait['mean']:.1f} p50={wait['p50']:.1f} p90={wait['p90']:.1f} max={wait['max']:.1f}",
+        f"  Service requests: {s['service_requests']} (false: {s['false_requests']}, rate {s['false_request_rate']:.2%}), "
+        f"blocked anomalous: {s['blocked_anomalous_requests']}",
+        f"  Phase counts: {phases}",
+        f"  Vehicle green utilization: {s['vehicle_green_utilization']:.1%}",
+        f"  Confidence at service: n={conf['count']} mean={conf['mean']:.2f} p50={conf['p50']:.2f} p90={conf['p90']:.2f}",
+        f"  Tracks: reacquired after dropout {s['track_reacquisitions']}, expired {s['tracks_expired']}",
+    ])
@@ -1,267 +1,447 @@
 # main_simulation.py
-import pygame
+import argparse
+import json
+import os
+import subprocess
 import sys
-import random
+import time
 from config import *
-from pedestrian_simulator import Pedestrian
-from rsu_simulator import RSU
-from traffic_light_controller import TrafficLightController
-
-# --- Pygame 初始化 ---
-pygame.init()
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("PI-BREPSC - Pedestrian Signal Simulation with Physical Information Fusion")
-clock = pygame.time.Clock()
-font_s = pygame.font.Font(DEFAULT_FONT_NAME, FONT_SIZE_SMALL)
-font_m = pygame.font.Font(DEFAULT_FONT_NAME, FONT_SIZE_MEDIUM)
-font_l = pygame.font.Font(DEFAULT_FONT_NAME, FONT_SIZE_LARGE)
-
-# --- 仿真对象实例化 ---
-rsu_unit = RSU(rsu_id="Intersection_RSU1", scanner_configs_dict=RSU_SCANNER_POSITIONS)
-tlc_unit = TrafficLightController()
-pedestrians_list = []
-selected_pedestrian_id = None # 用于显示详细信息
-
-# --- 辅助函数 ---
-def draw_text(surface, text, pos, font, color=DARK_GREY, center_aligned=False):
-    text_surf = font.render(text, True, color)
-    text_rect = text_surf.get_rect()
-    if center_aligned:
-        text_rect.center = pos
-    else:
-        text_rect.topleft = pos
-    surface.blit(text_surf, text_rect)
-
-def spawn_pedestrian(ped_id_counter, side="west", y_offset=0):
-    """Spawns a pedestrian in the sidewalk area on the specified side and plans a path."""
-    start_y = random.randint(int(H_CROSSWALK_RECT_NORTH.centery - ROAD_WIDTH*0.8), 
-                             int(H_CROSSWALK_RECT_SOUTH.centery + ROAD_WIDTH*0.8)) + y_offset
-    
-    if side == "west":
-        start_x = WAIT_AREA_WEST.left + PEDESTRIAN_RADIUS + 5
-        target_wait_x = WAIT_AREA_WEST.right - PEDESTRIAN_RADIUS - 10
-        target_wait_area_key = "WAIT_AREA_WEST"
-        color = BLUE
-    else: # east
-        start_x = WAIT_AREA_EAST.right - PEDESTRIAN_RADIUS - 5
-        target_wait_x = WAIT_AREA_EAST.left + PEDESTRIAN_RADIUS + 10
-        target_wait_area_key = "WAIT_AREA_EAST"
-        color = (0,100,200) # 深蓝
-
-    ped = Pedestrian(id_num=ped_id_counter, start_pos=(start_x, start_y), color=color, target_wait_area_key=target_wait_area_key)
-    ped.set_path_to_point((target_wait_x, start_y)) # 移动到等待区边缘
-    pedestrians_list.append(ped)
-    return ped_id_counter + 1
-
-# --- 初始化一些行人 ---
-ped_id_counter = 1
-ped_id_counter = spawn_pedestrian(ped_id_counter, "west", y_offset=-20)
-ped_id_counter = spawn_pedestrian(ped_id_counter, "west", y_offset=20)
-# ped_id_counter = spawn_pedestrian(ped_id_counter, "east") # 生成1个东侧行人
-
-if pedestrians_list:
-    selected_pedestrian_id = pedestrians_list[0].id
-
-
-# --- 主仿真循环 ---
-running = True
-while running:
-    # --- 事件处理 ---
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
+# pygame 与 NumPy 相关的仿真模块只在需要它们的子命令中导入，无界面运行不会初始化 SDL
+
+def run_interactive(sim=None):
+    """交互式窗口运行；sim 为空时按默认场景新建"""
+    import pygame
+    import random
+    from simulation_core import Simulation
+    from simulation_snapshot import save_snapshot, load_snapshot
+    from scene_renderer import render_scene
+
+    # --- Pygame 初始化 ---
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("PI-BREPSC - Pedestrian Signal Simulation with Physical Information Fusion")
+    clock = pygame.time.Clock()
+
+    # --- 仿真对象实例化 ---
+    if sim is None:
+        sim = Simulation()
+        sim.spawn_initial_pedestrians() # 初始化一些行人
+    selected_pedestrian_id = None # 用于显示详细信息
+    if sim.pedestrians_list:
+        selected_pedestrian_id = sim.pedestrians_list[0].id
+
+    # --- 主仿真循环 ---
+    running = True
+    while running:
+        # --- 事件处理 ---
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
                 running = False
-            if event.key == pygame.K_s: # Spawn new pedestrian from West
-                ped_id_counter = spawn_pedestrian(ped_id_counter, "west", y_offset=random.randint(-20, 20))
-                if not selected_pedestrian_id and pedestrians_list: selected_pedestrian_id = pedestrians_list[-1].id
-            if event.key == pygame.K_d: # Spawn new pedestrian from East
-                ped_id_counter = spawn_pedestrian(ped_id_counter, "east", y_offset=random.randint(-20, 20))
-                if not selected_pedestrian_id and pedestrians_list: selected_pedestrian_id = pedestrians_list[-1].id
-            if event.key == pygame.K_b: # Selected pedestrian presses button
-                if selected_pedestrian_id:
-                    for p in pedestrians_list:
-                        if p.id == selected_pedestrian_id:
-                            p.is_requesting_button_press = not p.is_requesting_button_press
-                            print(f"{p.id} button press: {p.is_requesting_button_press}")
-                            break
-            if event.key == pygame.K_m: # Toggle malicious for selected
-                if selected_pedestrian_id:
-                    for p in pedestrians_list:
-                        if p.id == selected_pedestrian_id:
-                            p.is_malicious = not p.is_malicious
-                            print(f"{p.id} malicious: {p.is_malicious}")
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                if event.key == pygame.K_s: # Spawn new pedestrian from West
+                    sim.spawn_pedestrian("west", y_offset=random.randint(-20, 20))
+                    if not selected_pedestrian_id and sim.pedestrians_list: selected_pedestrian_id = sim.pedestrians_list[-1].id
+                if event.key == pygame.K_d: # Spawn new pedestrian from East
+                    sim.spawn_pedestrian("east", y_offset=random.randint(-20, 20))
+                    if not selected_pedestrian_id and sim.pedestrians_list: selected_pedestrian_id = sim.pedestrians_list[-1].id
+                if event.key == pygame.K_b: # Selected pedestrian presses button
+                    if selected_pedestrian_id:
+                        for p in sim.pedestrians_list:
+                            if p.id == selected_pedestrian_id:
+                                p.is_requesting_button_press = not p.is_requesting_button_press
+                                print(f"{p.id} button press: {p.is_requesting_button_press}")
+                                break
+                if event.key == pygame.K_m: # Toggle malicious for selected
+                    if selected_pedestrian_id:
+                        for p in sim.pedestrians_list:
+                            if p.id == selected_pedestrian_id:
+                                p.is_malicious = not p.is_malicious
+                                print(f"{p.id} malicious: {p.is_malicious}")
+                                break
+                if event.key == pygame.K_F5: # Save snapshot
+                    save_snapshot(sim, SNAPSHOT_DEFAULT_PATH)
+                    print(f"Snapshot saved at frame {sim.frame}: {SNAPSHOT_DEFAULT_PATH}")
+                if event.key == pygame.K_F9: # Restore snapshot
+                    try:
+                        sim = load_snapshot(SNAPSHOT_DEFAULT_PATH)
+                        print(f"Snapshot restored at frame {sim.frame}: {SNAPSHOT_DEFAULT_PATH}")
+                    except FileNotFoundError:
+                        print(f"No snapshot at {SNAPSHOT_DEFAULT_PATH}")
+                    except ValueError as e:
+                        print(f"Cannot restore snapshot: {e}")
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1: # Left click to select pedestrian
+                    mouse_pos = event.pos
+                    for p in sim.pedestrians_list:
+                        dist_sq = (mouse_pos[0] - p.pos[0])**2 + (mouse_pos[1] - p.pos[1])**2
+                        if dist_sq < (p.radius * 2)**2 : # Click near pedestrian
+                            selected_pedestrian_id = p.id
                             break
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1: # Left click to select pedestrian
-                mouse_pos = event.pos
-                for p in pedestrians_list:
-                    dist_sq = (mouse_pos[0] - p.pos[0])**2 + (mouse_pos[1] - p.pos[1])**2
-                    if dist_sq < (p.radius * 2)**2 : # Click near pedestrian
-                        selected_pedestrian_id = p.id
-                        break
-
-    # --- 更新逻辑 ---
-    for ped in pedestrians_list:
-        ped.update()
-        # 自动请求过马路
-        if ped.is_at_wait_area and not ped.is_requesting_button_press:
-            ped.is_requesting_button_press = True
-            print(f"{ped.id} auto button press")
-
-    rsu_unit.scan_and_process_pedestrians(pedestrians_list)
-    rsu_request_priority = rsu_unit.determine_signal_request_priority()
-    tlc_unit.update(rsu_request_priority)
-
-    # Pedestrian crossing logic (simplified)
-    if tlc_unit.pedestrian_phase == "walk":
-        for ped in pedestrians_list:
-            if ped.is_at_wait_area:
-                # 移动到对面的等待区域 (强制在人行横道中心)
-                target_y = H_CROSSWALK_RECT_NORTH.centery # 强制在人行横道中心
-                if ped.target_wait_area_key == "WAIT_AREA_WEST":
-                    ped.set_path_to_point((WAIT_AREA_EAST.left + PEDESTRIAN_RADIUS + 5, target_y))
-                    ped.target_wait_area_key = "WAIT_AREA_EAST"
-                else:
-                    ped.set_path_to_point((WAIT_AREA_WEST.right - PEDESTRIAN_RADIUS - 5, target_y))
-                    ped.target_wait_area_key = "WAIT_AREA_WEST"
-                ped.is_requesting_button_press = False # 完成过马路后重置
-
-    # --- 绘图 ---
-    screen.fill(LIGHT_BLUE) # Light blue background
-
-    # 绘制道路和人行横道
-    pygame.draw.rect(screen, DARK_GREY, V_ROAD_RECT) # Main road
-
-    # Draw crosswalk (multiple lines)
-    crosswalk_line_width = 8
-    crosswalk_spacing = 15
-    num_lines = int(H_CROSSWALK_RECT_NORTH.width // (crosswalk_line_width + crosswalk_spacing))
-    
-    for i in range(num_lines):
-        x = H_CROSSWALK_RECT_NORTH.left + i * (crosswalk_line_width + crosswalk_spacing)
-        pygame.draw.rect(screen, WHITE, (x, H_CROSSWALK_RECT_NORTH.top, crosswalk_line_width, H_CROSSWALK_RECT_NORTH.height)) # 北
-        pygame.draw.rect(screen, WHITE, (x, H_CROSSWALK_RECT_SOUTH.top, crosswalk_line_width, H_CROSSWALK_RECT_SOUTH.height)) # 南
-
-    # Draw waiting area (schematic)
-    pygame.draw.rect(screen, (230,230,250), WAIT_AREA_WEST) # Light purple
-    pygame.draw.rect(screen, BLACK, WAIT_AREA_WEST,1)
-    draw_text(screen, "W_Area", (WAIT_AREA_WEST.centerx, WAIT_AREA_WEST.top + 5), font_s, BLACK, center_aligned=True)
-    pygame.draw.rect(screen, (230,250,230), WAIT_AREA_EAST) # Light green
-    pygame.draw.rect(screen, BLACK, WAIT_AREA_EAST,1)
-    draw_text(screen, "E_Area", (WAIT_AREA_EAST.centerx, WAIT_AREA_EAST.top + 5), font_s, BLACK, center_aligned=True)
-
-
-    # Draw vehicle traffic lights (below road)
-    v_light_base_x = V_ROAD_RECT.centerx
-    v_light_base_y = V_ROAD_RECT.bottom + 140 # Below road (5cm = 100 pixels + 40)
-    tlc_unit.draw(screen)
-
-    # Draw RSU scanner (on sidewalk)
-    rsu_scanner_radius = 7
-    rsu_color = (50,50,150)
-    draw_offset = 20
-    pygame.draw.circle(screen, rsu_color, (V_ROAD_RECT.left - draw_offset, H_CROSSWALK_RECT_NORTH.centery), rsu_scanner_radius) # 西
-    draw_text(screen, "W", (V_ROAD_RECT.left - draw_offset, H_CROSSWALK_RECT_NORTH.centery-15), font_s, rsu_color, center_aligned=True)
-    pygame.draw.circle(screen, rsu_color, (V_ROAD_RECT.right + draw_offset, H_CROSSWALK_RECT_NORTH.centery),rsu_scanner_radius) # 东
-    draw_text(screen, "E", (V_ROAD_RECT.right + draw_offset, H_CROSSWALK_RECT_NORTH.centery-15), font_s, rsu_color, center_aligned=True)
-    pygame.draw.circle(screen, rsu_color, (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_NORTH.top - draw_offset), rsu_scanner_radius) # 北
-    draw_text(screen, "N", (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_NORTH.top - draw_offset-15), font_s, rsu_color, center_aligned=True)
-    pygame.draw.circle(screen,  rsu_color, (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_SOUTH.bottom + draw_offset),rsu_scanner_radius) # 南
-    draw_text(screen, "S", (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_SOUTH.bottom + draw_offset-15), font_s,rsu_color, center_aligned=True)
-
-    # 绘制行人
-    for ped in pedestrians_list:
-        ped_rsu_data = rsu_unit.pedestrian_tracking_data.get(ped.id)
-        ped.draw(screen, ped_rsu_data)
-
-    # 绘制车辆 (示例)
-    vehicle_width = 30
-    vehicle_height = 50
-    vehicle_color = (128, 0, 128)  # 紫色
-    vehicle_x = V_ROAD_RECT.centerx - vehicle_width // 2
-    vehicle_y1 = V_ROAD_RECT.top + 50
-    vehicle_y2 = V_ROAD_RECT.top + 150
-    vehicle_y3 = V_ROAD_RECT.top + 250
-    
-    # 根据交通灯状态决定是否绘制车辆
-    v_colors, _, _ = tlc_unit.get_signal_display_info()
-    vehicle_speed = 2
-    if v_colors["green"] == GREEN: # 绿灯
-        vehicle_y1 += vehicle_speed # 车辆向下行驶
-        if vehicle_y1 > SCREEN_HEIGHT:
-            vehicle_y1 = V_ROAD_RECT.top + 50
-        vehicle_y2 += vehicle_speed
-        if vehicle_y2 > SCREEN_HEIGHT:
-            vehicle_y2 = V_ROAD_RECT.top + 150
-        vehicle_y3 += vehicle_speed
-        if vehicle_y3 > SCREEN_HEIGHT:
-            vehicle_y3 = V_ROAD_RECT.top + 250
-    else: # 红灯或黄灯
-        vehicle_y1 = V_ROAD_RECT.top + 50
-        vehicle_y2 = V_ROAD_RECT.top + 150
-        vehicle_y3 = V_ROAD_RECT.top + 250
-        draw_text(screen, "GO", (vehicle_x + vehicle_width // 2, vehicle_y1 + vehicle_height // 2), font_m, WHITE, center_aligned=True) # 更改STOP颜色
-    pygame.draw.rect(screen, vehicle_color, (vehicle_x, vehicle_y1, vehicle_width, vehicle_height), border_radius=5) # Draw stopped or moving vehicles
-    pygame.draw.rect(screen, vehicle_color, (vehicle_x, vehicle_y2, vehicle_width, vehicle_height), border_radius=5)
-    pygame.draw.rect(screen, vehicle_color, (vehicle_x, vehicle_y3, vehicle_width, vehicle_height), border_radius=5)
-
-    # --- Draw debug info panel ---
-    info_panel_x = 10
-    info_panel_y = 10
-    draw_text(screen, "PI-BREPSC Simulation", (info_panel_x, info_panel_y), font_m, BLACK)
-    info_panel_y += 30
-    draw_text(screen, f"Vehicle Light: {tlc_unit.vehicle_phase.upper()}", (info_panel_x, info_panel_y), font_s)
-    info_panel_y += 20
-    draw_text(screen, f"Pedestrian Light: {tlc_unit.pedestrian_phase.upper()}", (info_panel_x, info_panel_y), font_s)
-    info_panel_y += 20
-    if tlc_unit.is_pedestrian_request_servicing:
-         draw_text(screen, "Servicing Pedestrian Request...", (info_panel_x, info_panel_y), font_s, ORANGE)
-    info_panel_y += 20
-    
-    info_panel_y += 10 # 分隔
-
-    if selected_pedestrian_id and selected_pedestrian_id in rsu_unit.pedestrian_tracking_data:
-        data = rsu_unit.pedestrian_tracking_data[selected_pedestrian_id]
-        ped_obj = next((p for p in pedestrians_list if p.id == selected_pedestrian_id), None)
-
-        draw_text(screen, f"Selected Pedestrian: {selected_pedestrian_id}", (info_panel_x, info_panel_y), font_s, BLUE)
-        info_panel_y += 20
-        if ped_obj:
-            draw_text(screen, f"  Position: ({int(ped_obj.pos[0])},{int(ped_obj.pos[1])})", (info_panel_x, info_panel_y), font_s)
-            info_panel_y += 18
-            draw_text(screen, f"  Motion State: {data['motion_state']}", (info_panel_x, info_panel_y), font_s)
-            info_panel_y += 18
-            draw_text(screen, f"  Button Pressed: {ped_obj.is_requesting_button_press}", (info_panel_x, info_panel_y), font_s)
-            info_panel_y += 18
-            draw_text(screen, f"  Is Malicious: {ped_obj.is_malicious}", (info_panel_x, info_panel_y), font_s)
-            info_panel_y += 18
-
-        draw_text(screen, f"  Avg RSSI: {data['avg_rssi_stable']:.1f} dBm (Std: {data['rssi_std_dev']:.1f})", (info_panel_x, info_panel_y), font_s)
-        info_panel_y += 18
-        draw_text(screen, f"  Is Anomalous: {data['is_anomalous']} ({data['anomaly_reason']})", (info_panel_x, info_panel_y), font_s, RED if data['is_anomalous'] else BLACK)
-        info_panel_y += 18
-        draw_text(screen, f"  Intent Prob: {data['intent_prob']:.2f}", (info_panel_x, info_panel_y), font_s, BLACK)
-        info_panel_y += 18
-        draw_text(screen, f"  Confidence: {data['confidence']:.2f}", (info_panel_x, info_panel_y), font_s, BLACK)
-        info_panel_y += 18
-        draw_text(screen, f"  High Conf Waiting: {data['time_waiting_high_conf_sec']:.1f}s", (info_panel_x, info_panel_y), font_s)
-        info_panel_y += 25
-        
-        # 显示每个扫描仪的RSSI值
-        draw_text(screen, "  Scanner RSSI:",(info_panel_x, info_panel_y), font_s)
-        info_panel_y +=18
-        for sc_id, rssi_hist in data["rssi_per_scanner"].items():
-            if rssi_hist:
-                draw_text(screen, f"    {sc_id}: {rssi_hist[-1]:.1f} dBm", (info_panel_x, info_panel_y), font_s)
-            info_panel_y += 18
-
-        draw_text(screen, "Controls: S/D=Spawn Ped, B=Button(Sel), M=Malicious(Sel),", (10, SCREEN_HEIGHT - 90), font_s, DARK_GREY)
-        draw_text(screen, "Click=Select, ESC=Exit", (10, SCREEN_HEIGHT - 70), font_s, DARK_GREY)
-
-    pygame.display.flip() # 更新整个屏幕
-    clock.tick(FPS) # 控制帧率
-
-pygame.quit()
-sys.exit()
\ No newline at end of file
+
+        # --- 更新逻辑 ---
+        sim.step()
+
+        # --- 绘图 ---
+        render_scene(screen, sim, selected_pedestrian_id)
+
+        pygame.display.flip() # 更新整个屏幕
+        clock.tick(FPS) # 控制帧率
+
+    print(sim.kpi_collector.format_summary())
+    if sim.embedded_comparator:
+        print(sim.embedded_comparator.format_report())
+    pygame.quit()
+    return 0
+
+
+# --- 命令行子命令 ---
+def parse_scenario(args):
+    scenario = dict(DEFAULT_SCENARIO)
+    for key in DEFAULT_SCENARIO:
+        value = getattr(args, key, None)
+        if value is not None:
+            scenario[key] = value
+    return scenario
+
+def parse_overrides(pairs):
+    """把 NAME=VALUE 形式的参数解析为 config 覆盖字典 (VALUE 按 Python 字面量解析)"""
+    import ast
+    overrides = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        try:
+            overrides[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name] = value
+    return overrides
+
+def frames_from_args(args):
+    return args.frames if args.frames is not None else int(args.seconds * FPS)
+
+def cache_enabled(args, seed):
+    """只有可复现的运行 (固定种子) 才使用结果缓存；--set RESULT_CACHE_ENABLED=False 与 --no-cache 相同"""
+    enabled = parse_overrides(args.set).get("RESULT_CACHE_ENABLED", RESULT_CACHE_ENABLED)
+    return enabled and not args.no_cache and seed is not None
+
+def cmd_view(args):
+    from simulation_core import Simulation, apply_config_overrides, seed_everything
+    apply_config_overrides(parse_overrides(args.set))
+    if args.seed is not None:
+        seed_everything(args.seed)
+    sim = Simulation(parse_scenario(args))
+    sim.spawn_initial_pedestrians()
+    return run_interactive(sim)
+
+def cmd_headless(args):
+    if args.startup_probe: # 只运行一帧，报告是否加载了 SDL (供 benchmark 子命令检查)
+        from simulation_core import run_headless
+        run_headless(1, seed=args.seed, scenario=parse_scenario(args))
+        print(json.dumps({"pygame_loaded": "pygame" in sys.modules, "modules_loaded": len(sys.modules)}))
+        return 0
+    num_frames, scenario, overrides = frames_from_args(args), parse_scenario(args), parse_overrides(args.set)
+    if cache_enabled(args, args.seed):
+        from result_cache import run_headless_cached
+        entry, hit = run_headless_cached(num_frames, args.seed, scenario, overrides, quiet=not args.verbose, with_trace=bool(args.trace))
+        kpi, embedded_report_text = entry["kpi"], entry["embedded_report_text"]
+        if hit: # JSON 输出时提示写到 stderr，不破坏 stdout 的 JSON
+            print(f"Result cache hit (simulated in {entry['elapsed_sec']:.1f}s originally)", file=sys.stderr if args.json else sys.stdout)
+        if args.trace:
+            import numpy as np
+            np.savez_compressed(args.trace, **entry["trace"])
+    else:
+        if args.trace:
+            print("--trace requires the result cache and a fixed --seed", file=sys.stderr)
+            return 2
+        from simulation_core import run_headless # 缓存命中时不需要导入仿真模块
+        sim = run_headless(num_frames, seed=args.seed, scenario=scenario, overrides=overrides, quiet=not args.verbose)
+        kpi = sim.kpi_collector.summary()
+        embedded_report_text = sim.embedded_comparator.format_report() if sim.embedded_comparator else None
+    if args.json:
+        print(json.dumps(kpi, indent=2))
+    else:
+        from kpi_metrics import format_kpi_summary
+        print(format_kpi_summary(kpi))
+    if embedded_report_text:
+        print(embedded_report_text)
+    return 0
+
+def cmd_sweep(args):
+    import ast
+    import itertools
+    import multiprocessing
+    # 在创建进程池前导入，fork 出的工作进程无需重复导入
+    if cache_enabled(args, 0): # 扫描总是使用 --seeds 中的固定种子
+        from result_cache import run_headless_summary_cached as run_summary
+        import simulation_core # noqa: F401 -- result_cache 在函数内才导入它，此处预先导入供 fork 出的工作进程继承
+    else:
+        from simulation_core import run_headless_summary as run_summary
+    values = [ast.literal_eval(v) for v in args.values.split(",")]
+    seeds = [int(v) for v in args.seeds.split(",")]
+    base_overrides = parse_overrides(args.set)
+    num_frames = frames_from_args(args)
+    runs = [{"num_frames": num_frames, "seed": seed, "scenario": parse_scenario(args),
+             "overrides": dict(base_overrides, **{args.param: value})}
+            for value, seed in itertools.product(values, seeds)]
+    processes = args.processes or multiprocessing.cpu_count()
+    with multiprocessing.Pool(processes=min(processes, len(runs))) as pool:
+        results = pool.map(run_summary, runs, chunksize=1)
+
+    if args.json:
+        print(json.dumps([{"value": params["overrides"][args.param], "seed": params["seed"], "kpi": kpi}
+                          for params, kpi in results], indent=2))
+        return 0
+    print(f"{args.param:>28} {'seed':>6} {'requests':>9} {'false%':>7} {'wait_mean':>10} {'wait_p90':>9} {'green%':>7}")
+    for params, kpi in results:
+        wait = kpi["pedestrian_wait_time_sec"]
+        print(f"{params['overrides'][args.param]!s:>28} {params['seed']:>6} {kpi['service_requests']:>9} "
+              f"{kpi['false_request_rate']:>7.1%} {wait['mean']:>10.1f} {wait['p90']:>9.1f} {kpi['vehicle_green_utilization']:>7.1%}")
+    return 0
+
+def cmd_replay(args):
+    from simulation_snapshot import load_snapshot
+    try:
+        sim = load_snapshot(args.snapshot) # 先检查文件，缺失或不是快照时给出明确的错误而不是反序列化的 traceback
+    except (OSError, ValueError) as e:
+        print(f"Cannot replay snapshot: {e}", file=sys.stderr)
+        return 2
+    if args.headless:
+        from simulation_core import run_headless
+        sim = run_headless(frames_from_args(args), seed=args.seed, snapshot_path=args.snapshot, quiet=not args.verbose)
+        print(f"Replayed from frame {sim.frame - frames_from_args(args)} to {sim.frame}")
+        print(sim.kpi_collector.format_summary())
+        return 0
+    return run_interactive(sim)
+
+def cmd_export(args):
+    from simulation_core import Simulation, apply_config_overrides, seed_everything
+    from frame_exporter import FrameExporter, export_simulation
+    apply_config_overrides(parse_overrides(args.set))
+    if args.seed is not None:
+        seed_everything(args.seed)
+    sim = Simulation(parse_scenario(args))
+    sim.spawn_initial_pedestrians()
+    width, height = EXPORT_RESOLUTION # 在 --set 覆盖之后读取
+    if args.width is not None:
+        width = args.width
+    if args.height is not None:
+        height = args.height
+    exporter = FrameExporter(args.output, fmt=args.format, resolution=(width, height),
+                             frame_stride=args.stride, queue_frames=args.queue_frames)
+    stats = export_simulation(sim, frames_from_args(args), exporter, quiet=not args.verbose)
+    print(f"Exported {stats['frames_written']} frames ({stats['format']}, {stats['resolution'][0]}x{stats['resolution'][1]}, "
+          f"{stats['output_fps']:g} fps) to {args.output}: {stats['bytes_written'] / 1e6:.1f} MB, dropped {stats['frames_dropped']}")
+    print(f"Scenario {stats['scenario_sec']:.0f}s exported in {stats['total_sec']:.1f}s "
+          f"(simulation thread {stats['sim_thread_sec']:.1f}s)")
+    if stats["format"] == "raw":
+        print(f"Raw RGB24 stream, e.g.: ffmpeg -f rawvideo -pixel_format rgb24 -video_size {width}x{height} "
+              f"-framerate {stats['output_fps']:g} -i {args.output} out.mp4")
+    return 0
+
+def cmd_placement(args):
+    import numpy as np
+    from scanner_placement import CoverageModel, search_layouts
+    ranked, baseline, stats = search_layouts(num_layouts=args.layouts, num_scanners=args.scanners, seed=args.seed,
+                                             processes=args.processes, top_k=args.top)
+    print(f"Evaluated {stats['layouts_evaluated']} layouts over {stats['candidate_sites']} candidate sites in "
+          f"{stats['elapsed_sec']:.1f}s ({stats['ms_per_layout']:.2f} ms/layout)")
+
+    def describe(name, metrics):
+        print(f"{name:<10} separability {metrics['separability']:.3f} (wait accept {metrics['wait_accept']:.3f}, "
+              f"passer-by reject {metrics['passerby_reject']:.3f}), coverage {metrics['coverage']:.1%}, "
+              f"loc sigma {metrics['mean_localization_sigma_m']:.2f} m")
+    describe("current", baseline)
+    for rank, (layout, metrics) in enumerate(ranked, start=1):
+        describe(f"#{rank}", metrics)
+        print("           " + ", ".join(f"({int(x)}, {int(y)})" for x, y in layout))
+
+    if args.save_maps: # 当前布局与最佳布局的覆盖图
+        model = CoverageModel()
+        arrays = {"grid_x": model.grid_x, "grid_y": model.grid_y}
+        layouts = {"current": np.array(list(RSU_SCANNER_POSITIONS.values()), dtype=float)}
+        if ranked:
+            layouts["best"] = ranked[0][0]
+        for name, layout in layouts.items():
+            arrays[f"{name}_layout"] = layout
+            for map_name, values in model.coverage_maps(layout).items():
+                arrays[f"{name}_{map_name}"] = values
+        np.savez_compressed(args.save_maps, **arrays)
+        print(f"Coverage maps saved to {args.save_maps}")
+    return 0
+
+def cmd_benchmark(args):
+    # 1. 启动时间：新进程中从启动解释器到无界面运行完成第一帧
+    probe_cmd = [sys.executable, os.path.abspath(__file__), "headless", "--startup-probe", "--seed", "0"]
+    startup_ms = []
+    probe = {}
+    for _ in range(args.startup_runs):
+        t0 = time.perf_counter()
+        out = subprocess.run(probe_cmd, capture_output=True, text=True, check=True).stdout
+        startup_ms.append((time.perf_counter() - t0) * 1000)
+        probe = json.loads(out.strip().splitlines()[-1])
+    startup_ms.sort()
+    median_ms = startup_ms[len(startup_ms) // 2]
+    print(f"Startup to first tick (headless): median {median_ms:.0f} ms over {args.startup_runs} runs "
+          f"(budget {STARTUP_BUDGET_MS} ms), modules loaded: {probe['modules_loaded']}, SDL loaded: {probe['pygame_loaded']}")
+
+    # 2. 端到端帧时间：仿真一步 + 离屏渲染一帧 (与交互窗口相同的场景)，运行时长覆盖行人过街的 walk 相位
+    import numpy as np
+    import pygame
+    from scene_renderer import render_scene
+    from simulation_core import Simulation, seed_everything, quiet_stdout
+    seed_everything(0)
+    sim = Simulation(dict(DEFAULT_SCENARIO, initial_west=args.pedestrians // 2, initial_east=args.pedestrians - args.pedestrians // 2))
+    sim.spawn_initial_pedestrians()
+    scene = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), depth=32)
+    selected_pedestrian_id = sim.pedestrians_list[0].id if sim.pedestrians_list else None
+    step_ms = np.empty(args.frames)
+    render_ms = np.empty(args.frames)
+    walk_frames = 0
+    with quiet_stdout():
+        for i in range(args.frames):
+            t0 = time.perf_counter()
+            sim.step()
+            t1 = time.perf_counter()
+            render_scene(scene, sim, selected_pedestrian_id)
+            step_ms[i] = (t1 - t0) * 1000
+            render_ms[i] = (time.perf_counter() - t1) * 1000
+            walk_frames += sim.tlc_unit.pedestrian_phase == "walk"
+    frame_ms = step_ms + render_ms
+    mean_frame_ms = frame_ms.mean()
+    print(f"Frame time with {args.pedestrians} pedestrians over {args.frames} frames ({walk_frames} in walk): "
+          f"step {step_ms.mean():.1f} ms + render {render_ms.mean():.1f} ms = {mean_frame_ms:.1f} ms mean, "
+          f"{np.percentile(frame_ms, 95):.1f} ms p95 (budget {FRAME_TIME_BUDGET_MS:.1f} ms, {1000 / mean_frame_ms:.0f} fps)")
+
+    # 3. 人群运动回归检查：密集生成行人时，任何一帧都不应有行人位于人行横道以外的车道上
+    from crowd_motion import off_route_pedestrians
+    seed_everything(0)
+    sim = Simulation(dict(DEFAULT_SCENARIO, spawn_interval_sec=1.0))
+    sim.spawn_initial_pedestrians()
+    max_off_route = 0
+    with quiet_stdout():
+        for _ in range(int(args.crowd_seconds * FPS)):
+            sim.step()
+            max_off_route = max(max_off_route, len(off_route_pedestrians(sim.pedestrians_list)))
+    print(f"Crowd containment: at most {max_off_route} pedestrians on the road outside the crosswalks "
+          f"over {args.crowd_seconds:g}s with {len(sim.pedestrians_list)} pedestrians")
+
+    failed = False
+    if probe["pygame_loaded"] or median_ms > STARTUP_BUDGET_MS:
+        print("Startup check FAILED")
+        failed = True
+    if mean_frame_ms > FRAME_TIME_BUDGET_MS:
+        print("Frame time check FAILED")
+        failed = True
+    if max_off_route:
+        print("Crowd containment check FAILED")
+        failed = True
+    return 1 if failed else 0
+
+def add_scenario_arguments(parser):
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--initial-west", dest="initial_west", type=int, help="initial pedestrians on the west side")
+    parser.add_argument("--initial-east", dest="initial_east", type=int, help="initial pedestrians on the east side")
+    parser.add_argument("--spawn-interval", dest="spawn_interval_sec", type=float, help="spawn a pedestrian every N seconds")
+    parser.add_argument("--malicious-fraction", dest="malicious_fraction", type=float, help="fraction of spawned pedestrians that are malicious")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE", help="override a config.py parameter (repeatable)")
+
+def add_duration_arguments(parser, default_seconds):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--frames", type=int, default=None, help="number of frames to simulate")
+    group.add_argument("--seconds", type=float, default=default_seconds, help="simulated seconds (default %(default)s)")
+
+def cmd_cache(args):
+    from result_cache import ResultCache
+    cache = ResultCache()
+    if args.action == "clear":
+        print(f"Removed {cache.clear()} cached runs from {cache.cache_dir}")
+        return 0
+    stats = cache.stats()
+    print(f"Result cache {stats['cache_dir']}: {stats['entries']} runs, "
+          f"{stats['bytes'] / 1e6:.1f} / {stats['max_bytes'] / 1e6:.0f} MB, code fingerprint {stats['code_fingerprint'][:12]}")
+    return 0
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="PI-BREPSC pedestrian signal simulation")
+    sub = parser.add_subparsers(dest="command")
+    parser.set_defaults(subcommands=sub.choices) # 供 main 判断第一个参数是否为子命令
+
+    p = sub.add_parser("view", help="interactive pygame window (default)")
+    add_scenario_arguments(p)
+    p.set_defaults(func=cmd_view)
+
+    p = sub.add_parser("headless", help="run without a display and print the KPI summary")
+    add_scenario_arguments(p)
+    add_duration_arguments(p, 600.0)
+    p.add_argument("--json", action="store_true", help="print the KPI summary as JSON")
+    p.add_argument("--verbose", action="store_true", help="keep the simulation's stdout messages")
+    p.add_argument("--no-cache", action="store_true", help="always simulate; do not read or write the result cache")
+    p.add_argument("--trace", metavar="NPZ", help="also save per-frame traces (phases, request priority, track count); needs --seed")
+    p.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    p.set_defaults(func=cmd_headless)
+
+    p = sub.add_parser("sweep", help="headless runs over parameter values x seeds in parallel")
+    add_scenario_arguments(p)
+    add_duration_arguments(p, 300.0)
+    p.add_argument("--param", required=True, help="config.py parameter to sweep, e.g. CONFIDENCE_HIGH_THRESHOLD")
+    p.add_argument("--values", required=True, help="comma-separated values")
+    p.add_argument("--seeds", default="0", help="comma-separated seeds (default %(default)s)")
+    p.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--json", action="store_true", help="print results as JSON")
+    p.add_argument("--no-cache", action="store_true", help="always simulate; do not read or write the result cache")
+    p.set_defaults(func=cmd_sweep)
+
+    p = sub.add_parser("replay", help="continue a saved snapshot, interactively or headless")
+    p.add_argument("snapshot", help="snapshot file (see F5 in the interactive view)")
+    p.add_argument("--headless", action="store_true", help="run without a display")
+    p.add_argument("--seed", type=int, default=None, help="reseed after restoring (default: keep snapshot RNG state)")
+    add_duration_arguments(p, 60.0)
+    p.add_argument("--verbose", action="store_true", help="keep the simulation's stdout messages")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("export", help="render frames offscreen (no display) and write them on a background thread")
+    add_scenario_arguments(p)
+    add_duration_arguments(p, 600.0)
+    p.add_argument("output", help="output directory for image sequences, or file for --format raw")
+    p.add_argument("--format", choices=("png", "tga", "bmp", "jpg", "raw"), default=None, help=f"default EXPORT_FORMAT ({EXPORT_FORMAT})")
+    p.add_argument("--width", type=int, default=None, help=f"default EXPORT_RESOLUTION ({EXPORT_RESOLUTION[0]})")
+    p.add_argument("--height", type=int, default=None, help=f"default EXPORT_RESOLUTION ({EXPORT_RESOLUTION[1]})")
+    p.add_argument("--stride", type=int, default=None, help=f"export every Nth simulation frame (default EXPORT_FRAME_STRIDE, {EXPORT_FRAME_STRIDE})")
+    p.add_argument("--queue-frames", type=int, default=None, help=f"reusable frame buffers (default EXPORT_QUEUE_FRAMES, {EXPORT_QUEUE_FRAMES})")
+    p.add_argument("--verbose", action="store_true", help="keep the simulation's stdout messages")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("placement", help="rank scanner layouts by coverage and wait/passer-by separability")
+    p.add_argument("--layouts", type=int, default=COVERAGE_SEARCH_LAYOUTS, help="random layouts to evaluate (default %(default)s)")
+    p.add_argument("--scanners", type=int, default=None, help="scanners per layout (default: as in RSU_SCANNER_POSITIONS)")
+    p.add_argument("--top", type=int, default=5, help="layouts to report (default %(default)s)")
+    p.add_argument("--seed", type=int, default=0, help="search seed (default %(default)s)")
+    p.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--save-maps", metavar="NPZ", help="save coverage maps of the current and best layouts")
+    p.set_defaults(func=cmd_placement)
+
+    p = sub.add_parser("benchmark", help="check startup time against STARTUP_BUDGET_MS, step + render time against FRAME_TIME_BUDGET_MS, crowd containment")
+    p.add_argument("--startup-runs", type=int, default=5, help="startup measurements (default %(default)s)")
+    p.add_argument("--pedestrians", type=int, default=500, help="pedestrians for the frame time benchmark (default %(default)s)")
+    p.add_argument("--frames", type=int, default=1800, help="frames for the frame time benchmark, long enough to include a walk phase (default %(default)s)")
+    p.add_argument("--crowd-seconds", type=float, default=60.0, help="simulated seconds for the crowd containment check (default %(default)s)")
+    p.set_defaults(func=cmd_benchmark)
+
+    p = sub.add_parser("cache", help="show or clear the headless result cache")
+    p.add_argument("action", nargs="?", choices=("info", "clear"), default="info", help="default %(default)s")
+    p.set_defaults(func=cmd_cache)
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    argv = list(argv if argv is not None else sys.argv[1:])
+    # 第一个参数不是子命令 (或没有参数) 时保持原来的行为：打开交互窗口，其余参数交给 view
+    if not argv or (argv[0] not in parser.get_default("subcommands") and argv[0] not in ("-h", "--help")):
+        argv = ["view"] + argv
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,9 @@
 # pedestrian_simulator.py
-import pygame
 import random
 import math
 from collections import deque # 用于高效地实现固定大小的历史记录
 from config import *
+from geometry import Rect
 
 class Pedestrian:
     def __init__(self, id_num, start_pos, color=BLUE, target_wait_area_key=None):
@@ -14,6 +14,7 @@ class Pedestrian:
         self.initial_color = color # 保存初始颜色
 
         self.path = deque() # 存储 (x,y) 目标点
+        self.flow_destination = None # 流场目的地 (crowd_motion.FLOW_DESTINATIONS 的键)，设置时代替 path
         self.current_velocity = [0,0] # 当前速度向量 [vx, vy] in pixels/frame
 
         # 运动状态相关
@@ -34,10 +35,16 @@ class Pedestrian:
 
     def set_path_to_point(self, target_pos):
         """设置单个目标点，清除现有路径"""
+        self.flow_destination = None
         self.path.clear()
         self.path.append(target_pos)
         self._calculate_velocity_to_next_target()
 
+    def set_flow_destination(self, destination_key):
+        """沿缓存的流场走向目的地区域 (如 "WAIT_AREA_EAST")，清除现有路径"""
+        self.path.clear()
+        self.flow_destination = destination_key
+
     def add_point_to_path(self, target_pos):
         """向路径末尾添加一个目标点"""
         self.path.append(target_pos)
@@ -71,9 +78,11 @@ class Pedestrian:
             (dy / distance_to_target) * PEDESTRIAN_SPEED_PIXELS_PER_FRAME if distance_to_target != 0 else 0
         ]
 
-    def update(self):
-        """更新行人位置和运动状态"""
-        if self.path:
+    def update(self, planned_velocity=None):
+        """更新行人位置和运动状态；planned_velocity 由人群运动规划 (crowd_motion) 给出时直接使用"""
+        if planned_velocity is not None:
+            self.current_velocity = planned_velocity
+        elif self.path:
             self._calculate_velocity_to_next_target() # 确保速度指向当前路径目标
 
         self.pos[0] += self.current_velocity[0]
@@ -86,11 +95,11 @@ class Pedestrian:
         # 检查是否在目标等待区域 (如果已定义)
         if self.target_wait_area_key:
             wait_area_rect = None
-            if self.target_wait_area_key == "WAIT_AREA_WEST": wait_area_rect = pygame.Rect(WAIT_AREA_WEST)
-            elif self.target_wait_area_key == "WAIT_AREA_EAST": wait_area_rect = pygame.Rect(WAIT_AREA_EAST)
+            if self.target_wait_area_key == "WAIT_AREA_WEST": wait_area_rect = WAIT_AREA_WEST
+            elif self.target_wait_area_key == "WAIT_AREA_EAST": wait_area_rect = WAIT_AREA_EAST
             
             if wait_area_rect:
-                ped_rect = pygame.Rect(self.pos[0]-self.radius, self.pos[1]-self.radius, self.radius*2, self.radius*2)
+                ped_rect = Rect(self.pos[0]-self.radius, self.pos[1]-self.radius, self.radius*2, self.radius*2)
                 self.is_at_wait_area = wait_area_rect.contains(ped_rect) # 完全在区域内
 
 
@@ -126,6 +135,8 @@ class Pedestrian:
         return speed_meters_per_sec
 
     def draw(self, screen, rsu_ped_data=None): # rsu_ped_data 是可选的，用于显示额外信息
+        import pygame # 仅绘图时需要
+        from scene_renderer import get_font
         draw_color = self.initial_color
         if self.is_malicious:
             draw_color = RED
@@ -141,6 +152,6 @@ class Pedestrian:
             pygame.draw.circle(screen, GREEN, (int(self.pos[0]), int(self.pos[1])), self.radius + 2, 2)
 
         # 显示ID
-        font_small = pygame.font.Font(DEFAULT_FONT_NAME, FONT_SIZE_SMALL)
+        font_small = get_font(FONT_SIZE_SMALL)
         id_text = font_small.render(self.id, True, BLACK)
         screen.blit(id_text, (self.pos[0] - self.radius, self.pos[1] - self.radius - 15))
\ No newline at end of file
@@ -0,0 +1,342 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+import zlib
+import config
+from config import *
+
+try:
+    import fcntl # 仅 POSIX；没有时淘汰不加锁 (条目本身的写入仍是原子的)
+except ImportError:
+    fcntl = None
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 决定无界面运行结果的模块：任何一个源文件变化 (例如修改 RSU 或 TLC 逻辑) 都会改变代码指纹，使旧条目失效
+SIMULATION_MODULES = (
+    "config", "geometry", "spatial_grid", "pedestrian_simulator", "crowd_motion",
+    "rsu_localizer", "track_manager", "rsu_simulator", "rsu_embedded_profile",
+    "traffic_light_controller", "kpi_metrics", "simulation_core",
+)
+
+# 可以用 overrides 覆盖的缓存设置 -> ResultCache 构造参数
+CACHE_SETTINGS = {
+    "RESULT_CACHE_DIR": "cache_dir",
+    "RESULT_CACHE_MAX_BYTES": "max_bytes",
+    "RESULT_CACHE_EVICT_TARGET_FRACTION": "evict_target_fraction",
+}
+
+TRACE_FIELDS = ("vehicle_phase", "pedestrian_phase", "request_priority", "tracked_devices", "pedestrians")
+VEHICLE_PHASE_CODES = {"green": 0, "yellow": 1, "red": 2}
+PEDESTRIAN_PHASE_CODES = {"dont_walk": 0, "walk": 1, "flash": 2}
+
+_code_fingerprint = None
+_simulation_parameter_names = None
+
+def code_fingerprint():
+    """仿真模块源代码的 sha256 (每个进程只计算一次，与已加载的代码一致)"""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        h = hashlib.sha256()
+        for name in SIMULATION_MODULES:
+            with open(os.path.join(SIM_DIR, name + ".py"), "rb") as f:
+                source = f.read()
+            h.update(name.encode() + b"\0" + hashlib.sha256(source).digest())
+        _code_fingerprint = h.hexdigest()
+    return _code_fingerprint
+
+def simulation_parameter_names():
+    """
+    仿真模块 (config.py 除外) 源代码中引用的 config 常量名。只有这些参数的覆盖会影响运行结果：
+    界面/导出设置，以及只在 config.py 中用于推导其它常量的参数 (如 ROAD_WIDTH，推导值不会重新计算)，覆盖后结果不变。
+    """
+    global _simulation_parameter_names
+    if _simulation_parameter_names is None:
+        referenced = set()
+        for name in SIMULATION_MODULES:
+            if name == "config":
+                continue
+            with open(os.path.join(SIM_DIR, name + ".py"), "r", encoding="utf-8") as f:
+                referenced.update(re.findall(r"\b[A-Z][A-Z0-9_]*\b", f.read()))
+        _simulation_parameter_names = frozenset(name for name in referenced
+                                                if name in vars(config) and not name.startswith("RESULT_CACHE_"))
+    return _simulation_parameter_names
+
+def effective_parameters(overrides=None):
+    """影响无界面运行结果的 config 常量 (见 simulation_parameter_names)，再应用 overrides 中的同名参数"""
+    names = simulation_parameter_names()
+    params = {name: getattr(config, name) for name in names}
+    for name, value in (overrides or {}).items():
+        if not hasattr(config, name):
+            raise KeyError(f"Unknown config parameter: {name}")
+        if name in names:
+            params[name] = value
+    return params
+
+def split_overrides(overrides):
+    """把 overrides 分为 (影响运行结果的, 不影响的)；结果缓存自身的设置 (RESULT_CACHE_*) 不在其中"""
+    names = simulation_parameter_names()
+    overrides = overrides or {}
+    return ({k: v for k, v in overrides.items() if k in names},
+            {k: v for k, v in overrides.items() if k not in names and not k.startswith("RESULT_CACHE_")})
+
+def make_key(num_frames, seed, scenario=None, overrides=None):
+    """由有效参数、场景、种子、帧数和代码指纹得到的内容地址 (sha256 十六进制)"""
+    material = {
+        "params": effective_parameters(overrides),
+        "scenario": dict(DEFAULT_SCENARIO, **(scenario or {})),
+        "seed": seed,
+        "num_frames": num_frames,
+        "code": code_fingerprint(),
+    }
+    encoded = json.dumps(material, sort_keys=True, default=repr, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    无界面运行结果的磁盘缓存。每个条目是 <key[:2]>/<key>.json (KPI 摘要等)，可选 <key>.trace.npz (逐帧轨迹)。
+    条目先写入同目录的临时文件再 os.replace，读者只会看到完整的旧文件或新文件，并行工作进程无需加锁即可读写；
+    命中时更新文件修改时间。写入时在 .size 中累加条目大小 (持有 .lock 文件锁)；只有累计值超过 max_bytes 时
+    才扫描整个目录，按修改时间删除最旧的条目，直到总大小不超过 max_bytes * evict_target_fraction。
+    无法解码的条目 (如写入中途断电) 读取时视为未命中并删除；其它 I/O 错误 (如只读的共享缓存) 只视为未命中。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, evict_target_fraction=None):
+        if cache_dir is None:
+            cache_dir = RESULT_CACHE_DIR
+        if max_bytes is None:
+            max_bytes = RESULT_CACHE_MAX_BYTES
+        if evict_target_fraction is None:
+            evict_target_fraction = RESULT_CACHE_EVICT_TARGET_FRACTION
+        self.cache_dir = os.path.join(SIM_DIR, cache_dir)
+        self.max_bytes = max_bytes
+        self.evict_target_fraction = evict_target_fraction
+
+    def _entry_path(self, key, suffix=".json"):
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def _remove_entry(self, key):
+        for suffix in (".json", ".trace.npz"): # 先删条目，再删轨迹
+            try:
+                os.unlink(self._entry_path(key, suffix))
+            except OSError: # 已被删除，或缓存目录只读
+                pass
+
+    def get(self, key, with_trace=False):
+        """返回缓存条目 (dict)，未命中返回 None；with_trace 时条目必须带有轨迹，并附加 entry["trace"]"""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if with_trace:
+                if not entry.get("has_trace"):
+                    return None
+                import numpy as np
+                with np.load(self._entry_path(key, ".trace.npz")) as npz:
+                    entry["trace"] = {name: npz[name] for name in npz.files}
+        except (ValueError, EOFError, zlib.error, zipfile.BadZipFile): # 文件截断或损坏 (JSONDecodeError 是 ValueError)：视为未命中并删除
+            self._remove_entry(key)
+            return None
+        except OSError: # 条目刚被淘汰，或无权读取：视为未命中，不删除
+            return None
+        try:
+            os.utime(path) # LRU: 记录最近使用
+        except OSError: # 只读缓存：不更新使用时间
+            pass
+        return entry
+
+    def put(self, key, entry, trace=None):
+        """写入条目 (trace 为 {字段: 数组})，然后按需淘汰"""
+        os.makedirs(os.path.dirname(self._entry_path(key)), exist_ok=True)
+        entry = dict(entry, key=key, has_trace=trace is not None, created=time.time())
+        written = 0
+        if trace is not None: # 先写轨迹，条目出现时轨迹已就绪
+            import numpy as np
+            written += self._atomic_write(self._entry_path(key, ".trace.npz"), lambda f: np.savez_compressed(f, **trace))
+        written += self._atomic_write(self._entry_path(key), lambda f: f.write(json.dumps(entry, indent=1).encode("utf-8")))
+        self._account(written)
+
+    def _atomic_write(self, path, write):
+        """原子写入，返回写入的字节数"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+            return size
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _scan(self):
+        """返回 {key: [修改时间, 总字节数, [路径...]]} (正在写入的临时文件不计入)"""
+        entries = {}
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for item in os.scandir(bucket.path):
+                if item.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = item.stat()
+                except FileNotFoundError:
+                    continue
+                key = item.name.split(".", 1)[0]
+                info = entries.setdefault(key, [0.0, 0, []])
+                if item.name.endswith(".json"):
+                    info[0] = st.st_mtime
+                info[1] += st.st_size
+                info[2].append(item.path)
+        return entries
+
+    def _lock(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        lock_file = open(os.path.join(self.cache_dir, ".lock"), "a")
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file # 关闭文件即释放锁
+
+    def _size_path(self):
+        return os.path.join(self.cache_dir, ".size")
+
+    def _read_size(self):
+        """.size 中的累计字节数；不存在或损坏时返回 None"""
+        try:
+            with open(self._size_path(), "r") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_size(self, total):
+        with open(self._size_path(), "w") as f:
+            f.write(str(total))
+
+    def _account(self, written):
+        """累加写入的字节数 (覆盖同一条目时会偏大，只会使扫描提前)；超过上限时扫描并成批淘汰"""
+        with self._lock():
+            total = self._read_size()
+            if total is None: # 首次使用或旧版本的缓存目录：扫描一次得到准确值
+                total = sum(info[1] for info in self._scan().values())
+            else:
+                total += written
+            if total > self.max_bytes:
+                total = self._evict_locked()
+            self._write_size(total)
+
+    def _evict_locked(self):
+        """扫描目录，删除最旧的条目直到不超过低水位，返回剩余字节数 (调用方持有锁)"""
+        entries = self._scan()
+        total = sum(info[1] for info in entries.values())
+        if total <= self.max_bytes:
+            return total
+        target = self.max_bytes * self.evict_target_fraction
+        for key, (mtime, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= target:
+                break
+            for path in sorted(paths, key=lambda p: not p.endswith(".json")): # 先删条目，再删轨迹
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        return total
+
+    def stats(self):
+        entries = self._scan()
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "bytes": sum(info[1] for info in entries.values()),
+            "max_bytes": self.max_bytes,
+            "code_fingerprint": code_fingerprint(),
+        }
+
+    def clear(self):
+        """删除全部条目，返回删除的条目数"""
+        with self._lock():
+            entries = self._scan()
+            for _, _, paths in entries.values():
+                for path in paths:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+            self._write_size(0)
+        return len(entries)
+
+
+class TraceRecorder:
+    """run_headless 的 frame_callback：逐帧记录信号相位、请求优先级、轨迹数与行人数"""
+
+    def __init__(self):
+        self.columns = {name: [] for name in TRACE_FIELDS}
+
+    def __call__(self, sim):
+        c = self.columns
+        c["vehicle_phase"].append(VEHICLE_PHASE_CODES.get(sim.tlc_unit.vehicle_phase, -1))
+        c["pedestrian_phase"].append(PEDESTRIAN_PHASE_CODES.get(sim.tlc_unit.pedestrian_phase, -1))
+        c["request_priority"].append(sim.last_request_priority)
+        c["tracked_devices"].append(len(sim.rsu_unit.pedestrian_tracking_data))
+        c["pedestrians"].append(len(sim.pedestrians_list))
+
+    def arrays(self):
+        import numpy as np
+        return {name: np.asarray(values, dtype=np.int16) for name, values in self.columns.items()}
+
+
+def cache_from_overrides(overrides=None):
+    """按 overrides 中的缓存设置 (如 --set RESULT_CACHE_DIR=...) 构造 ResultCache，未覆盖的设置取自 config"""
+    overrides = overrides or {}
+    return ResultCache(**{arg: overrides[name] for name, arg in CACHE_SETTINGS.items() if name in overrides})
+
+def run_headless_cached(num_frames, seed, scenario=None, overrides=None, quiet=True, with_trace=False, cache=None):
+    """
+    带缓存的 run_headless，返回 (条目, 是否命中)。条目含 "kpi" (KPI 摘要)、"embedded_report" (或 None)、
+    "embedded_report_text"、"elapsed_sec" 以及 with_trace 时的 "trace"。
+    seed 为 None 的运行不可复现，调用方不应使用缓存。
+    """
+    if cache is None:
+        cache = cache_from_overrides(overrides)
+    key = make_key(num_frames, seed, scenario, overrides)
+    entry = cache.get(key, with_trace=with_trace)
+    if entry is not None:
+        return entry, True
+
+    from simulation_core import run_headless
+    recorder = TraceRecorder() if with_trace else None
+    t0 = time.perf_counter()
+    sim = run_headless(num_frames, seed=seed, scenario=scenario, overrides=overrides, quiet=quiet, frame_callback=recorder)
+    comparator = sim.embedded_comparator
+    applied, ignored = split_overrides(overrides)
+    entry = {
+        # 只记录影响结果的覆盖；不影响结果的覆盖不进入键，也不作为条目标签
+        "params": {"num_frames": num_frames, "seed": seed, "scenario": sim.scenario, "overrides": applied,
+                   "ignored_overrides": sorted(ignored)},
+        "kpi": sim.kpi_collector.summary(),
+        "embedded_report": comparator.report() if comparator else None,
+        "embedded_report_text": comparator.format_report() if comparator else None,
+        "elapsed_sec": time.perf_counter() - t0,
+    }
+    trace = recorder.arrays() if recorder else None
+    cache.put(key, entry, trace)
+    if trace is not None:
+        entry["trace"] = trace
+    return entry, False
+
+def run_headless_summary_cached(run_params):
+    """参数扫描的带缓存工作函数：与 simulation_core.run_headless_summary 相同的接口"""
+    entry, _ = run_headless_cached(run_params["num_frames"], run_params["seed"], run_params.get("scenario"),
+                                   run_params.get("overrides"))
+    return run_params, entry["kpi"]
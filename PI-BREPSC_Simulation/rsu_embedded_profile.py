@@ -0,0 +1,397 @@
+# rsu_embedded_profile.py
+import zlib
+import numpy as np
+from config import *
+from rsu_localizer import RSSILocalizer
+
+MOTION_STATE_CODES = {"moving": 0, "stationary_short": 1, "stationary_long": 2}
+ANOMALY_REASONS = ["", "Marked Malicious", "High RSSI Variance while Stationary", "Implausible Speed", "Strong RSSI at Far Distance"]
+RSSI_NO_SAMPLE = np.iinfo(np.int16).min # RSSI环形缓冲中表示 "本帧未收到" 的哨兵值
+
+
+class EmbeddedRSU:
+    """
+    嵌入式版本 (Embedded_Hardware_Version/rsu.c) 的 RSU 模型：
+    整数 RSSI (int16)、单精度浮点 (float32) 状态、容量固定的逐设备状态表，以及 MCU 可承受的窗口长度。
+    规则与 RSU 的 PI-BPRV 流程一致，便于与全精度流程逐帧比较决策差异。
+    """
+
+    def __init__(self, scanner_configs_dict, max_devices=None, rssi_window_frames=None, speed_window_frames=None):
+        if max_devices is None:
+            max_devices = EMBEDDED_MAX_TRACKED_DEVICES
+        if rssi_window_frames is None:
+            rssi_window_frames = EMBEDDED_RSSI_WINDOW_FRAMES
+        if speed_window_frames is None:
+            speed_window_frames = EMBEDDED_SPEED_WINDOW_FRAMES
+        self.scanner_configs = scanner_configs_dict
+        self.max_devices = max_devices
+        self.rssi_window_frames = rssi_window_frames
+        self.speed_window_frames = speed_window_frames
+        self.localizer = RSSILocalizer(scanner_configs_dict, dtype=np.float32)
+        num_scanners = len(self.localizer.scanner_ids)
+        self.scanner_pos = np.array([scanner_configs_dict[sc_id] for sc_id in self.localizer.scanner_ids], dtype=np.int16).reshape(-1, 2)
+
+        # --- 固定大小的逐设备状态表 (下标为槽位号) ---
+        n = max_devices
+        self.device_hash = np.zeros(n, dtype=np.uint32) # 设备标识 (MCU 上为 BLE 地址哈希)
+        self.rssi_ring = np.full((n, rssi_window_frames, num_scanners), RSSI_NO_SAMPLE, dtype=np.int16)
+        self.rssi_head = np.zeros(n, dtype=np.uint8)
+        self.rssi_sum = np.zeros(n, dtype=np.int32)    # 窗口内RSSI和 (用于O(1)均值)
+        self.rssi_sum_sq = np.zeros(n, dtype=np.int32) # 窗口内RSSI平方和 (用于O(1)方差)
+        self.rssi_count = np.zeros(n, dtype=np.uint16)
+        self.est_pos = np.zeros((n, 2), dtype=np.float32)
+        self.est_pos_cov = np.zeros((n, 3), dtype=np.float32) # 对称矩阵只存 xx, xy, yy
+        self.pos_ring = np.zeros((n, speed_window_frames, 2), dtype=np.int16)
+        self.pos_head = np.zeros(n, dtype=np.uint8)
+        self.pos_count = np.zeros(n, dtype=np.uint8)
+        self.speed_mps = np.zeros(n, dtype=np.float32)
+        self.track_age = np.zeros(n, dtype=np.uint16) # 已定位的帧数 (饱和计数)，用于捕获期与速度预热
+        self.motion_state = np.zeros(n, dtype=np.uint8)
+        self.flags = np.zeros(n, dtype=np.uint8) # bit0: 在等待区, bit1: 异常, bit2: 按钮请求, bit3: 速度有效
+        self.anomaly_reason = np.zeros(n, dtype=np.uint8)
+        self.intent_prob = np.zeros(n, dtype=np.float32)
+        self.confidence = np.zeros(n, dtype=np.float32)
+        self.frames_high_intent = np.zeros(n, dtype=np.uint16)
+        self.frames_waiting_conf = np.zeros(n, dtype=np.uint16) # 中/高置信度等待帧数
+
+        self.slot_of = {} # ped.id -> 槽位号 (模拟 MCU 上的设备哈希表)
+        self.free_slots = list(range(n - 1, -1, -1))
+        self.untracked_device_frames = 0 # 因状态表已满而无法追踪的 (设备, 帧) 次数
+        self.last_request_ped_id = None # 最近一次触发信号请求的设备 (用于KPI统计)
+
+    # 每个设备槽位占用的字节数 (所有逐设备数组之和 + 哈希表项)
+    PER_DEVICE_TABLES = ("device_hash", "rssi_ring", "rssi_head", "rssi_sum", "rssi_sum_sq", "rssi_count",
+                         "est_pos", "est_pos_cov", "pos_ring", "pos_head", "pos_count", "speed_mps", "track_age", "motion_state",
+                         "flags", "anomaly_reason", "intent_prob", "confidence", "frames_high_intent", "frames_waiting_conf")
+
+    def bytes_per_device(self):
+        table_bytes = sum(getattr(self, name).nbytes for name in self.PER_DEVICE_TABLES) // self.max_devices
+        return table_bytes + EMBEDDED_HASH_ENTRY_BYTES
+
+    def max_devices_for_ram(self, ram_bytes=None):
+        if ram_bytes is None:
+            ram_bytes = EMBEDDED_RAM_BUDGET_BYTES
+        return ram_bytes // self.bytes_per_device()
+
+    def _allocate_slot(self, ped_id):
+        if not self.free_slots:
+            return None
+        slot = self.free_slots.pop()
+        self.slot_of[ped_id] = slot
+        self.device_hash[slot] = zlib.crc32(str(ped_id).encode()) # 与 PYTHONHASHSEED 无关，快照与分支之间保持一致
+        self.rssi_ring[slot] = RSSI_NO_SAMPLE
+        self.rssi_head[slot] = 0
+        self.rssi_sum[slot] = 0
+        self.rssi_sum_sq[slot] = 0
+        self.rssi_count[slot] = 0
+        self.est_pos[slot] = np.nan # 标记为未定位
+        self.est_pos_cov[slot] = 0
+        self.pos_head[slot] = 0
+        self.pos_count[slot] = 0
+        self.speed_mps[slot] = 0
+        self.track_age[slot] = 0
+        self.flags[slot] = 0
+        self.anomaly_reason[slot] = 0
+        self.intent_prob[slot] = 0
+        self.confidence[slot] = 0
+        self.frames_high_intent[slot] = 0
+        self.frames_waiting_conf[slot] = 0
+        return slot
+
+    def _release_slot(self, ped_id):
+        self.free_slots.append(self.slot_of.pop(ped_id))
+
+    def process_frame(self, pedestrians_list, rssi_by_ped):
+        """
+        处理一帧。rssi_by_ped: {ped.id: {scanner_id: rssi_dbm}}，只包含仍被追踪的行人；本帧漏收的为空字典。
+        RSSI 按 rsu.c 的方式取整为整数 dBm。
+        """
+        # 未检测到的设备释放槽位
+        for ped_id in [pid for pid in self.slot_of if pid not in rssi_by_ped]:
+            self._release_slot(ped_id)
+
+        slots = []
+        peds = []
+        for ped_obj in pedestrians_list:
+            current_rssi = rssi_by_ped.get(ped_obj.id)
+            if not current_rssi: # 未检测到 (空字典: 本帧漏收，保留槽位与状态)
+                continue
+            slot = self.slot_of.get(ped_obj.id)
+            if slot is None:
+                slot = self._allocate_slot(ped_obj.id)
+                if slot is None:
+                    self.untracked_device_frames += 1
+                    continue
+            frame_rssi = np.full(len(self.localizer.scanner_ids), RSSI_NO_SAMPLE, dtype=np.int16)
+            for sc_id, rssi in current_rssi.items():
+                frame_rssi[self.localizer.scanner_column[sc_id]] = int(round(float(rssi)))
+
+            # 环形缓冲：移出最旧一帧，写入本帧，同时维护整数和与平方和
+            head = self.rssi_head[slot]
+            old = self.rssi_ring[slot, head]
+            old_valid = old != RSSI_NO_SAMPLE
+            new_valid = frame_rssi != RSSI_NO_SAMPLE
+            old_i32 = old[old_valid].astype(np.int32)
+            new_i32 = frame_rssi[new_valid].astype(np.int32)
+            self.rssi_sum[slot] += new_i32.sum() - old_i32.sum()
+            self.rssi_sum_sq[slot] += (new_i32 * new_i32).sum() - (old_i32 * old_i32).sum()
+            self.rssi_count[slot] = int(self.rssi_count[slot]) + int(new_valid.sum()) - int(old_valid.sum()) # 差值可能为负 (漏收)，不能直接对 uint16 做 +=
+            self.rssi_ring[slot, head] = frame_rssi
+            self.rssi_head[slot] = (head + 1) % self.rssi_window_frames
+
+            self.motion_state[slot] = MOTION_STATE_CODES.get(ped_obj.motion_state, 0)
+            flags = self.flags[slot] & 0b1011
+            if ped_obj.is_requesting_button_press:
+                flags |= 0b100
+            self.flags[slot] = flags
+            slots.append(slot)
+            peds.append(ped_obj)
+
+        if not slots:
+            return
+        slots = np.array(slots, dtype=np.intp)
+        self._localize(slots, peds)
+        self._detect_anomalies(slots, peds)
+        self._infer_intent_and_confidence(slots)
+
+    def _localize(self, slots, peds):
+        last_rssi = self.rssi_ring[slots, (self.rssi_head[slots].astype(np.intp) - 1) % self.rssi_window_frames]
+        rssi_matrix = np.where(last_rssi == RSSI_NO_SAMPLE, np.float32(np.nan), last_rssi.astype(np.float32))
+        tx_power = np.array([p.ble_tx_power for p in peds], dtype=np.float32)
+        age = self.track_age[slots].astype(np.int32)
+        cov = self.est_pos_cov[slots]
+        # 捕获期内先验放宽 (与 RSU 相同)
+        acquisition_var = np.where(age < LOCALIZATION_ACQUISITION_FRAMES,
+                                   np.float32((LOCALIZATION_ACQUISITION_NOISE_METERS * PIXELS_PER_METER)**2), np.float32(0))
+        prior_cov = np.stack([cov[:, 0] + acquisition_var, cov[:, 1], cov[:, 1], cov[:, 2] + acquisition_var], axis=1).reshape(-1, 2, 2)
+        pos, pos_cov = self.localizer.localize(rssi_matrix, tx_power, self.est_pos[slots], prior_cov)
+        self.est_pos[slots] = pos
+        self.est_pos_cov[slots] = np.stack([pos_cov[:, 0, 0], pos_cov[:, 0, 1], pos_cov[:, 1, 1]], axis=1)
+        self.track_age[slots] = np.minimum(age + 1, 0xFFFF)
+
+        # 速度：每 EMBEDDED_SPEED_SAMPLE_STRIDE 帧把估计位置 (int16 像素) 写入环形缓冲，取最旧与最新位置之差。
+        # 预热期内或定位标准差过大时清空缓冲；样本未覆盖整个速度窗口时速度无效 (与 RSU 相同)
+        sigma_px = np.sqrt(np.maximum(np.maximum(pos_cov[:, 0, 0], pos_cov[:, 1, 1]), 0))
+        unconverged = (age < LOCALIZATION_SPEED_WARMUP_FRAMES) | (sigma_px > LOCALIZATION_SPEED_MAX_SIGMA_METERS * PIXELS_PER_METER)
+        self.pos_count[slots[unconverged]] = 0
+        sample = ~unconverged & (age % EMBEDDED_SPEED_SAMPLE_STRIDE == 0)
+        s_slots = slots[sample]
+        if len(s_slots):
+            pos_i16 = np.clip(np.rint(pos[sample]), -32768, 32767).astype(np.int16)
+            head = self.pos_head[s_slots].astype(np.intp)
+            self.pos_ring[s_slots, head] = pos_i16
+            self.pos_head[s_slots] = (head + 1) % self.speed_window_frames
+            self.pos_count[s_slots] = np.minimum(self.pos_count[s_slots] + 1, self.speed_window_frames)
+            count = self.pos_count[s_slots].astype(np.intp)
+            oldest = self.pos_ring[s_slots, (head + 1 - count) % self.speed_window_frames].astype(np.float32)
+            displacement = np.hypot(pos_i16[:, 0] - oldest[:, 0], pos_i16[:, 1] - oldest[:, 1])
+            window_sec = np.maximum(count - 1, 1).astype(np.float32) * EMBEDDED_SPEED_SAMPLE_STRIDE / FPS
+            self.speed_mps[s_slots] = displacement / PIXELS_PER_METER / window_sec
+        valid = (self.pos_count[slots].astype(np.int32) - 1) * EMBEDDED_SPEED_SAMPLE_STRIDE >= LOCALIZATION_SPEED_WINDOW_FRAMES
+        self.speed_mps[slots] = np.where(valid, self.speed_mps[slots], 0.0)
+        self.flags[slots] = (self.flags[slots] & 0b0111) | (valid.astype(np.uint8) << 3)
+
+        # 等待区判断 (每侧放宽 WAIT_AREA_TOLERANCE_SIGMA 个定位标准差，与 RSU 相同)
+        tol_x = 2 * WAIT_AREA_TOLERANCE_SIGMA * np.sqrt(np.maximum(pos_cov[:, 0, 0], 0))
+        tol_y = 2 * WAIT_AREA_TOLERANCE_SIGMA * np.sqrt(np.maximum(pos_cov[:, 1, 1], 0))
+        at_wait = np.zeros(len(slots), dtype=bool)
+        for area in (WAIT_AREA_WEST, WAIT_AREA_EAST):
+            at_wait |= ((pos[:, 0] >= area.left - tol_x / 2) & (pos[:, 0] < area.right + tol_x / 2) &
+                        (pos[:, 1] >= area.top - tol_y / 2) & (pos[:, 1] < area.bottom + tol_y / 2))
+        self.flags[slots] = (self.flags[slots] & 0b1110) | at_wait.astype(np.uint8)
+
+    def _rssi_temporal_std(self, slots):
+        """各扫描仪RSSI相对各自窗口均值的合并标准差 (规则A2，与 RSU._update_rssi_history 相同)，由环形缓冲直接计算"""
+        ring = self.rssi_ring[slots] # (K,W,S)
+        valid = ring != RSSI_NO_SAMPLE
+        count = valid.sum(axis=1) # (K,S)
+        values = np.where(valid, ring, 0).astype(np.int32)
+        sums = values.sum(axis=1)
+        within_ss = (values * values).sum(axis=(1, 2)).astype(np.float32) - (
+            (sums * sums).astype(np.float32) / np.maximum(count, 1)).sum(axis=1)
+        dof = count.sum(axis=1) - (count > 0).sum(axis=1)
+        std = np.sqrt(np.maximum(within_ss, 0) / np.maximum(dof, 1).astype(np.float32))
+        return np.where(dof >= RSSI_STABILITY_MIN_DOF, std, 0).astype(np.float32)
+
+    def _rssi_window_stats(self, slots):
+        """由整数和与平方和求窗口内RSSI均值与标准差 (float32)"""
+        count = np.maximum(self.rssi_count[slots], 1).astype(np.float32)
+        mean = self.rssi_sum[slots].astype(np.float32) / count
+        std = np.sqrt(np.maximum(self.rssi_sum_sq[slots].astype(np.float32) / count - mean * mean, 0))
+        return mean, std
+
+    def _detect_anomalies(self, slots, peds):
+        temporal_std = self._rssi_temporal_std(slots)
+        speed = self.speed_mps[slots]
+        speed_valid = (self.flags[slots] & 0b1000) != 0
+        motion = self.motion_state[slots]
+
+        # A4 所需: 本帧平均RSSI与到所听到扫描仪的平均估计距离
+        last_rssi = self.rssi_ring[slots, (self.rssi_head[slots].astype(np.intp) - 1) % self.rssi_window_frames]
+        heard = last_rssi != RSSI_NO_SAMPLE
+        num_heard = np.maximum(heard.sum(axis=1), 1).astype(np.float32)
+        avg_current_rssi = np.where(heard, last_rssi, 0).sum(axis=1).astype(np.float32) / num_heard
+        diff = self.est_pos[slots][:, None, :] - self.scanner_pos[None, :, :].astype(np.float32)
+        dist_m = np.sqrt((diff * diff).sum(axis=2)) / PIXELS_PER_METER
+        avg_dist_m = np.where(heard, dist_m, 0).sum(axis=1) / num_heard
+
+        malicious = np.array([p.is_malicious for p in peds], dtype=bool)
+        rule_a2 = (temporal_std > SHADOW_FADING_SIGMA_DB * 2.5) & ((motion != MOTION_STATE_CODES["moving"]) | (speed_valid & (speed < 0.1)))
+        rule_a3 = speed_valid & (speed > MAX_SPEED_METERS_PER_SEC * 1.2)
+        rule_a4 = (avg_current_rssi > -40) & (avg_dist_m > 15)
+        # 按 RSU 中规则的先后顺序取第一个命中的原因
+        reason = np.select([malicious, rule_a2, rule_a3, rule_a4], [1, 2, 3, 4], default=0).astype(np.uint8)
+        self.anomaly_reason[slots] = reason
+        self.flags[slots] = (self.flags[slots] & 0b1101) | ((reason > 0).astype(np.uint8) << 1)
+
+    def _infer_intent_and_confidence(self, slots):
+        mean, std = self._rssi_window_stats(slots)
+        flags = self.flags[slots]
+        anomalous = (flags & 0b010) != 0
+        at_wait = (flags & 0b001) != 0
+        button = (flags & 0b100) != 0
+
+        waiting = (self.motion_state[slots] == MOTION_STATE_CODES["stationary_long"]) & at_wait & (mean > RSSI_WAITING_THRESHOLD_DBM)
+        intent = self.intent_prob[slots]
+        intent = np.where(waiting, np.minimum(1.0, intent + np.float32(INTENT_PROB_INCREMENT)),
+                          np.maximum(0.0, intent - np.float32(INTENT_PROB_DECREMENT))).astype(np.float32)
+        frames_high = self.frames_high_intent[slots].astype(np.int32)
+        frames_high = np.where(waiting, frames_high + (intent >= CONFIDENCE_MEDIUM_THRESHOLD), 0)
+
+        conf_rssi = np.clip((mean - RSSI_WAITING_THRESHOLD_DBM) * np.float32(CONFIDENCE_FROM_RSSI_FACTOR), 0, 0.3)
+        conf_stability = np.clip(CONFIDENCE_FROM_STABILITY_MAX * (1 - std / np.float32(SHADOW_FADING_SIGMA_DB * 2)), 0, CONFIDENCE_FROM_STABILITY_MAX)
+        conf_duration = np.clip((frames_high.astype(np.float32) / FPS) * np.float32(0.1), 0, CONFIDENCE_FROM_DURATION_MAX)
+        conf = np.clip(conf_rssi + conf_stability + conf_duration, 0, 1.0).astype(np.float32)
+        conf = np.where(button & (intent > 0.5), np.maximum(conf, np.float32(0.85)), conf)
+        conf = np.where(intent > 0.1, conf, 0).astype(np.float32)
+
+        # 异常设备清零
+        intent = np.where(anomalous, 0, intent).astype(np.float32)
+        conf = np.where(anomalous, 0, conf).astype(np.float32)
+        frames_high = np.where(anomalous, 0, frames_high)
+
+        frames_waiting = self.frames_waiting_conf[slots].astype(np.int32)
+        frames_waiting = np.where(conf >= CONFIDENCE_MEDIUM_THRESHOLD, np.minimum(frames_waiting + 1, 0xFFFF), 0)
+        frames_waiting = np.where(anomalous, self.frames_waiting_conf[slots], frames_waiting) # RSU 对异常设备不更新等待时间
+
+        self.intent_prob[slots] = intent
+        self.confidence[slots] = conf
+        self.frames_high_intent[slots] = np.minimum(frames_high, 0xFFFF)
+        self.frames_waiting_conf[slots] = frames_waiting
+
+    def determine_signal_request_priority(self):
+        """与 RSU.determine_signal_request_priority 相同的 PSO-PSBF 规则 (不打印)"""
+        self.last_request_ped_id = None
+        if not self.slot_of:
+            return 0
+        ped_ids = list(self.slot_of.keys())
+        slots = np.fromiter(self.slot_of.values(), dtype=np.intp, count=len(self.slot_of))
+        normal = (self.flags[slots] & 0b010) == 0
+        conf = self.confidence[slots]
+        wait_sec = self.frames_waiting_conf[slots].astype(np.float32) / FPS
+        high = normal & (conf >= CONFIDENCE_HIGH_THRESHOLD) & (wait_sec >= TARGET_WAITING_TIME_BLE_HIGH_CONF)
+        if high.any():
+            self.last_request_ped_id = ped_ids[int(np.argmax(high))] # 与 RSU 相同：第一个达到高优先级的设备
+            return 2
+        medium = normal & (conf >= CONFIDENCE_MEDIUM_THRESHOLD) & (conf < CONFIDENCE_HIGH_THRESHOLD) & (wait_sec >= TARGET_WAITING_TIME_BLE_MEDIUM_CONF)
+        if medium.any():
+            self.last_request_ped_id = ped_ids[len(medium) - 1 - int(np.argmax(medium[::-1]))] # 与 RSU 相同：最后一个中等优先级设备
+            return 1
+        return 0
+
+    def get_device_state(self, ped_id):
+        """以与 RSU.pedestrian_tracking_data 相近的字段返回单个设备状态 (调试用)"""
+        slot = self.slot_of.get(ped_id)
+        if slot is None:
+            return None
+        flags = int(self.flags[slot])
+        return {
+            "est_pos": (float(self.est_pos[slot, 0]), float(self.est_pos[slot, 1])),
+            "current_speed_mps": float(self.speed_mps[slot]),
+            "is_at_wait_area": bool(flags & 0b001),
+            "is_anomalous": bool(flags & 0b010),
+            "anomaly_reason": ANOMALY_REASONS[self.anomaly_reason[slot]],
+            "intent_prob": float(self.intent_prob[slot]),
+            "confidence": float(self.confidence[slot]),
+            "time_waiting_high_conf_sec": self.frames_waiting_conf[slot] / FPS,
+        }
+
+
+class EmbeddedProfileComparator:
+    """
+    让嵌入式版本与全精度 RSU 并行运行：两者使用同一帧的 RSSI 采样，统计决策差异。
+    嵌入式模式下由嵌入式流程的请求优先级驱动 TLC，全精度 RSU 作为参考。
+    """
+
+    def __init__(self, reference_rsu, embedded_rsu=None):
+        self.reference_rsu = reference_rsu
+        self.embedded_rsu = embedded_rsu or EmbeddedRSU(reference_rsu.scanner_configs)
+        self.frames = 0
+        self.priority_mismatch_frames = 0
+        self.device_frames = 0
+        self.anomaly_mismatches = 0
+        self.intent_mismatches = 0 # 意图是否达到中等阈值的判断不一致
+        self.confidence_level_mismatches = 0 # 置信度等级 (无/中/高) 不一致
+        self.max_abs_confidence_diff = 0.0
+
+    @staticmethod
+    def _confidence_level(conf):
+        if conf >= CONFIDENCE_HIGH_THRESHOLD:
+            return 2
+        return 1 if conf >= CONFIDENCE_MEDIUM_THRESHOLD else 0
+
+    def observe_frame(self, pedestrians_list, reference_priority):
+        """在参考 RSU 完成本帧扫描后调用，返回嵌入式流程的请求优先级"""
+        track_manager = self.reference_rsu.track_manager
+        tracking = self.reference_rsu.pedestrian_tracking_data
+        # 与参考 RSU 共用轨迹生命周期：滑行中的轨迹本帧没有采样 (空字典)，但保留槽位
+        rssi_by_ped = {ped_id: (data["current_rssi"] if track_manager.is_seen_this_frame(data) else {})
+                       for ped_id, data in tracking.items()}
+        embedded = self.embedded_rsu
+        embedded.process_frame(pedestrians_list, rssi_by_ped)
+        embedded_priority = embedded.determine_signal_request_priority()
+
+        self.frames += 1
+        if embedded_priority != reference_priority:
+            self.priority_mismatch_frames += 1
+        for ped_id, data in tracking.items():
+            slot = embedded.slot_of.get(ped_id)
+            if slot is None or not track_manager.is_seen_this_frame(data):
+                continue
+            self.device_frames += 1
+            if bool(embedded.flags[slot] & 0b010) != bool(data["is_anomalous"]):
+                self.anomaly_mismatches += 1
+            if (embedded.intent_prob[slot] >= CONFIDENCE_MEDIUM_THRESHOLD) != (data["intent_prob"] >= CONFIDENCE_MEDIUM_THRESHOLD):
+                self.intent_mismatches += 1
+            emb_conf = float(embedded.confidence[slot])
+            if self._confidence_level(emb_conf) != self._confidence_level(data["confidence"]):
+                self.confidence_level_mismatches += 1
+            self.max_abs_confidence_diff = max(self.max_abs_confidence_diff, abs(emb_conf - float(data["confidence"])))
+        return embedded_priority
+
+    def report(self):
+        embedded = self.embedded_rsu
+        device_frames = max(self.device_frames, 1)
+        return {
+            "bytes_per_device": embedded.bytes_per_device(),
+            "table_capacity": embedded.max_devices,
+            "max_devices_for_ram_budget": embedded.max_devices_for_ram(),
+            "ram_budget_bytes": EMBEDDED_RAM_BUDGET_BYTES,
+            "untracked_device_frames": embedded.untracked_device_frames,
+            "frames": self.frames,
+            "priority_mismatch_rate": self.priority_mismatch_frames / self.frames if self.frames else 0.0,
+            "anomaly_mismatch_rate": self.anomaly_mismatches / device_frames,
+            "intent_mismatch_rate": self.intent_mismatches / device_frames,
+            "confidence_level_mismatch_rate": self.confidence_level_mismatches / device_frames,
+            "max_abs_confidence_diff": self.max_abs_confidence_diff,
+        }
+
+    def format_report(self):
+        r = self.report()
+        return "\n".join([
+            f"Embedded profile: {r['bytes_per_device']} B/device, table capacity {r['table_capacity']}, "
+            f"{r['max_devices_for_ram_budget']} devices fit in {r['ram_budget_bytes']} B (untracked device-frames: {r['untracked_device_frames']})",
+            f"  Divergence vs full precision over {r['frames']} frames: priority {r['priority_mismatch_rate']:.2%}, "
+            f"anomaly {r['anomaly_mismatch_rate']:.2%}, intent {r['intent_mismatch_rate']:.2%}, "
+            f"confidence level {r['confidence_level_mismatch_rate']:.2%}, max |dconf| {r['max_abs_confidence_diff']:.3f}",
+        ])
@@ -0,0 +1,102 @@
+# rsu_localizer.py
+import math
+import numpy as np
+from config import *
+
+class RSSILocalizer:
+    """
+    基于多扫描仪RSSI的批量行人定位。
+    对所有被追踪设备同时求解加权最小二乘 (Gauss-Newton)，反演对数距离路径损耗模型；
+    上一帧的估计 (均值+协方差) 作为先验并用于热启动，相当于逐帧的迭代扩展卡尔曼更新。
+    输入输出位置单位为像素，内部以米计算。dtype 可设为 np.float32 以模拟嵌入式单精度运算。
+    """
+
+    def __init__(self, scanner_configs_dict, dtype=np.float64):
+        self.dtype = dtype
+        self.scanner_ids = list(scanner_configs_dict.keys())
+        self.scanner_column = {sc_id: col for col, sc_id in enumerate(self.scanner_ids)} # scanner_id -> RSSI矩阵列号
+        self.scanner_pos_m = np.array([scanner_configs_dict[sc_id] for sc_id in self.scanner_ids], dtype=dtype).reshape(-1, 2) / PIXELS_PER_METER
+
+        # 对数距离模型: rssi = tx - k*ln(d/d0) - 平均人体遮挡
+        self._k = 10 * PATH_LOSS_EXPONENT_N / math.log(10)
+        self._mean_body_loss_db = BODY_SHADOWING_PROBABILITY * BODY_SHADOWING_ATTENUATION_DB_MEAN
+        self._meas_weight = 1.0 / LOCALIZATION_RSSI_SIGMA_DB**2
+
+    @staticmethod
+    def _inv2x2(m):
+        """批量 2x2 矩阵求逆 (N,2,2)"""
+        a, b, c, d = m[:, 0, 0], m[:, 0, 1], m[:, 1, 0], m[:, 1, 1]
+        det = a * d - b * c
+        det = np.where(np.abs(det) < 1e-12, 1e-12, det)
+        inv = np.empty_like(m)
+        inv[:, 0, 0] = d / det
+        inv[:, 0, 1] = -b / det
+        inv[:, 1, 0] = -c / det
+        inv[:, 1, 1] = a / det
+        return inv
+
+    def _initial_guess_m(self, rssi, heard):
+        """无先验的设备：以RSSI推算的 1/d 为权重，取所听到扫描仪的加权质心"""
+        w = np.where(heard, 10 ** (np.nan_to_num(rssi, nan=RSSI_VALID_RANGE_DBM[0]) / (10 * PATH_LOSS_EXPONENT_N)), 0.0)
+        w_sum = w.sum(axis=1, keepdims=True)
+        centroid = (w @ self.scanner_pos_m) / np.where(w_sum > 0, w_sum, 1.0)
+        no_scanner = (w_sum[:, 0] <= 0)
+        if no_scanner.any(): # 理论上不会发生 (至少有一个扫描仪在范围内)，退化为全部扫描仪的中心
+            centroid[no_scanner] = self.scanner_pos_m.mean(axis=0)
+        return centroid
+
+    def localize(self, rssi_matrix_dbm, tx_power_dbm, prior_pos_px, prior_cov_px2):
+        """
+        rssi_matrix_dbm: (N,S) 本帧RSSI，未收到的 (行人, 扫描仪) 对为 NaN
+        tx_power_dbm: (N,) 发射功率
+        prior_pos_px: (N,2) 上一帧位置估计，新设备为 NaN
+        prior_cov_px2: (N,2,2) 上一帧协方差
+        返回 (pos_px (N,2), cov_px2 (N,2,2))
+        """
+        rssi = np.asarray(rssi_matrix_dbm, dtype=self.dtype).reshape(-1, len(self.scanner_ids))
+        n = rssi.shape[0]
+        if n == 0:
+            return np.empty((0, 2), dtype=self.dtype), np.empty((0, 2, 2), dtype=self.dtype)
+        tx = np.asarray(tx_power_dbm, dtype=self.dtype).reshape(n)
+        heard = ~np.isnan(rssi)
+
+        # 先验: 上一帧估计 + 随机游走过程噪声；新设备用加权质心 + 大方差
+        prior = np.asarray(prior_pos_px, dtype=self.dtype).reshape(n, 2) / PIXELS_PER_METER
+        prior_cov = np.asarray(prior_cov_px2, dtype=self.dtype).reshape(n, 2, 2) / PIXELS_PER_METER**2
+        is_new = np.isnan(prior).any(axis=1)
+        if is_new.any():
+            prior[is_new] = self._initial_guess_m(rssi[is_new], heard[is_new])
+            prior_cov[is_new] = np.eye(2, dtype=self.dtype) * LOCALIZATION_INITIAL_SIGMA_METERS**2
+        prior_cov = prior_cov + np.eye(2, dtype=self.dtype) * LOCALIZATION_PROCESS_NOISE_METERS**2
+        prior_info = self._inv2x2(prior_cov)
+
+        # 截断在有效范围边界的读数只说明 "至少这么远/这么近"，降低其权重
+        clipped = heard & ((rssi <= RSSI_VALID_RANGE_DBM[0] + 0.5) | (rssi >= RSSI_VALID_RANGE_DBM[1] - 0.5))
+        w = np.where(heard, self.dtype(self._meas_weight), self.dtype(0.0))
+        w[clipped] *= LOCALIZATION_CLIPPED_RSSI_WEIGHT
+        y = np.nan_to_num(rssi) - (tx[:, None] - self._mean_body_loss_db)
+
+        d0_sq = PATH_LOSS_D0_METERS**2
+        pos = prior.copy()
+        info = prior_info
+        for _ in range(LOCALIZATION_GN_ITERATIONS):
+            diff = pos[:, None, :] - self.scanner_pos_m[None, :, :] # (N,S,2)
+            dist_sq = np.einsum('nsi,nsi->ns', diff, diff)
+            beyond_d0 = dist_sq > d0_sq # 参考距离以内模型无路径损耗，梯度为零
+            dist_sq = np.maximum(dist_sq, d0_sq)
+
+            residual = y + self._k * 0.5 * np.log(dist_sq / d0_sq) # 测量 - 模型预测
+            jac = np.where(beyond_d0[..., None], -self._k * diff / dist_sq[..., None], 0.0) # d(预测)/d(位置)
+
+            wj = w[..., None] * jac
+            info = np.einsum('nsi,nsj->nij', wj, jac) + prior_info
+            grad = np.einsum('nsi,ns->ni', wj, residual) - np.einsum('nij,nj->ni', prior_info, pos - prior)
+            step = np.einsum('nij,nj->ni', self._inv2x2(info), grad)
+
+            # 限制单次步长，避免几何退化时发散
+            step_norm = np.linalg.norm(step, axis=1, keepdims=True)
+            step *= np.minimum(1.0, LOCALIZATION_MAX_STEP_METERS / np.maximum(step_norm, 1e-12))
+            pos += step
+
+        cov = self._inv2x2(info)
+        return pos * PIXELS_PER_METER, cov * PIXELS_PER_METER**2
@@ -1,23 +1,52 @@
 # rsu_simulator.py
 import math
-import random
 import numpy as np
 from collections import deque
 from config import *
+from rsu_localizer import RSSILocalizer
+from track_manager import TrackManager, TRACK_TENTATIVE
+
+def link_budget_range_meters():
+    """平均RSSI (加上衰落余量) 降到有效下限时的距离 (米)"""
+    return PATH_LOSS_D0_METERS * 10 ** (
+        (DEFAULT_TX_POWER_DBM - RSSI_VALID_RANGE_DBM[0] + RSU_RANGE_FADING_MARGIN_DB) / (10 * PATH_LOSS_EXPONENT_N))
+
+def max_scan_range_meters():
+    """扫描范围裁剪距离 (米)：链路预算距离与实际扫描仪接收距离中的较小者，按当前参数计算"""
+    return min(link_budget_range_meters(), RSU_SCANNER_RANGE_METERS)
 
 class RSU:
-    def __init__(self, rsu_id, scanner_configs_dict):
+    def __init__(self, rsu_id, scanner_configs_dict, max_scan_range_m=None):
         self.id = rsu_id
         self.scanner_configs = scanner_configs_dict # {"scanner_id": (x,y_pos)}
 
+        # 基于RSSI的批量定位 (RSU 无法获得行人真实位置)
+        self.localizer = RSSILocalizer(self.scanner_configs)
+
+        # 扫描范围裁剪：每帧一次性计算全部 (行人, 扫描仪) 距离，只模拟范围内的对。
+        # 扫描仪按定位器的列顺序排列，本帧的 RSSI 矩阵可以直接交给定位器
+        if max_scan_range_m is None:
+            max_scan_range_m = max_scan_range_meters()
+        self.max_scan_range_pixels = max_scan_range_m * PIXELS_PER_METER
+        self.scanner_ids = self.localizer.scanner_ids
+        self.scanner_pos_px = np.array([self.scanner_configs[sc_id] for sc_id in self.scanner_ids], dtype=float).reshape(-1, 2)
+
         # 存储每个检测到的行人的详细数据
         # key: ped.id
         # value: dict {
-        #   "rssi_per_scanner": {scanner_id: deque(maxlen=20)}, # RSSI历史
+        #   "rssi_per_scanner": {scanner_id: deque(maxlen=RSSI_HISTORY_FRAMES)}, # RSSI历史 (稀疏: 仅含范围内的扫描仪)
+        #   "rssi_sums": {scanner_id: [和, 平方和]}, # 各扫描仪RSSI历史的滑动和 (O(1) 更新均值/标准差)
         #   "avg_rssi_stable": float, # 稳定的平均RSSI
         #   "rssi_std_dev": float,    # RSSI标准差 (稳定性指标)
-        #   "last_pos": (x,y),
-        #   "current_speed_mps": float,
+        #   "rssi_temporal_std_db": float, # 各扫描仪RSSI相对各自均值的标准差 (异常跳变检测)
+        #   "last_pos": (x,y),       # 真实位置 (仅供显示/调试)
+        #   "est_pos": (x,y),        # RSSI定位估计位置 (像素)
+        #   "est_pos_cov": 2x2 array, # 估计位置协方差 (像素^2)
+        #   "est_pos_frame": int,     # 最近一次定位的帧号
+        #   "est_pos_history": deque, # (帧号, 估计位置) 历史 (用于速度估计)
+        #   "current_rssi": dict,     # 最近一次检测到时各扫描仪的RSSI
+        #   "current_speed_mps": float, # 由估计位置计算的速度
+        #   "speed_valid": bool,        # 速度是否可用 (定位收敛后的样本覆盖整个速度窗口)
         #   "motion_state": str,
         #   "is_at_wait_area": bool,
         #   "is_anomalous": bool,
@@ -25,43 +54,36 @@ class RSU:
         #   "intent_prob": float,
         #   "confidence": float,
         #   "frames_high_intent": int, # 意图概率高于某个阈值的帧数
-        #   "time_waiting_high_conf_sec": float # 高置信度等待时间
+        #   "time_waiting_high_conf_sec": float, # 高置信度等待时间
+        #   "track_state", "track_hits", "first_seen_frame", "last_seen_frame": 由 TrackManager 维护
         # }
-        self.pedestrian_tracking_data = {}
-
-    def _simulate_rssi_value(self, ped_tx_power, ped_pos, ped_velocity_vec, scanner_pos):
-        """模拟单个RSSI值，包含更丰富的物理效应"""
-        dx_pixels = ped_pos[0] - scanner_pos[0]
-        dy_pixels = ped_pos[1] - scanner_pos[1]
-        distance_pixels = math.sqrt(dx_pixels**2 + dy_pixels**2)
-        distance_meters = max(distance_pixels / PIXELS_PER_METER, 0.1) # 避免log(0)
-
-        # 1. 路径损耗 (Log-Distance Model)
-        if distance_meters <= PATH_LOSS_D0_METERS:
-            path_loss_db = 0 # 简化处理非常近的情况
-        else:
-            path_loss_db = 10 * PATH_LOSS_EXPONENT_N * math.log10(distance_meters / PATH_LOSS_D0_METERS)
+        # 轨迹的创建、滑行与超时删除由 TrackManager 负责，漏检的设备不会立即丢失状态
+        self.track_manager = TrackManager()
+        self.pedestrian_tracking_data = self.track_manager.tracks
+        self.last_request_ped_id = None # 最近一次触发信号请求的行人 (用于KPI统计)
+
+    def _simulate_rssi_values(self, tx_power_dbm, distance_px):
+        """批量模拟 K 个 (行人, 扫描仪) 对的RSSI，包含更丰富的物理效应；随机数取自 numpy 全局随机数生成器"""
+        k = len(distance_px)
+        distance_meters = np.maximum(distance_px / PIXELS_PER_METER, 0.1) # 避免log(0)
+
+        # 1. 路径损耗 (Log-Distance Model)，参考距离以内简化为无损耗
+        path_loss_db = 10 * PATH_LOSS_EXPONENT_N * np.log10(np.maximum(distance_meters, PATH_LOSS_D0_METERS) / PATH_LOSS_D0_METERS)
 
         # 2. 阴影衰落 (Shadow Fading)
-        shadowing_db = random.gauss(0, SHADOW_FADING_SIGMA_DB)
+        shadowing_db = np.random.normal(0, SHADOW_FADING_SIGMA_DB, k)
 
         # 3. 人体遮挡 (Body Shadowing) - 概率性
-        body_attenuation_db = 0
-        # 简单模型：如果行人朝向远离扫描仪的方向移动，或者随机发生
         # 这里用随机模拟，更复杂的需要行人朝向数据
-        if random.random() < 0.4: # 40% 概率发生遮挡
-            body_attenuation_db = random.gauss(BODY_SHADOWING_ATTENUATION_DB_MEAN, BODY_SHADOWING_ATTENUATION_DB_STD)
+        shadowed = np.random.random(k) < BODY_SHADOWING_PROBABILITY
+        body_attenuation_db = np.where(shadowed, np.random.normal(BODY_SHADOWING_ATTENUATION_DB_MEAN, BODY_SHADOWING_ATTENUATION_DB_STD, k), 0.0)
 
         # 4. 简化的多普勒效应 (可选)
-        # 如果行人速度分量指向或背离扫描仪，RSSI 可能略微增强或减弱
-        doppler_shift_db = 0
-        # TODO: 实现基于 ped_velocity_vec 和扫描仪方向的简单多普勒效应模拟
+        # TODO: 实现基于行人速度和扫描仪方向的简单多普勒效应模拟
         # 例如，如果径向速度 > 阈值，则增加/减少 RSSI_DOPPLER_MAX_SHIFT_DB
 
-        raw_rssi = ped_tx_power - path_loss_db + shadowing_db - body_attenuation_db + doppler_shift_db
-        
-        # 限制RSSI在合理范围
-        return np.clip(raw_rssi, RSSI_VALID_RANGE_DBM[0], RSSI_VALID_RANGE_DBM[1])
+        raw_rssi = tx_power_dbm - path_loss_db + shadowing_db - body_attenuation_db
+        return np.clip(raw_rssi, RSSI_VALID_RANGE_DBM[0], RSSI_VALID_RANGE_DBM[1]) # 限制RSSI在合理范围
 
     def _perform_physics_anomaly_detection(self, ped_id, ped_object, current_rssi_values):
         """执行基于物理规则的异常检测"""
@@ -77,27 +99,29 @@ class RSU:
 
         # A2. RSSI 值异常跳变/不稳定
         # (需要比较当前RSSI均值和历史RSSI均值，或检查RSSI标准差)
-        if data["rssi_std_dev"] > SHADOW_FADING_SIGMA_DB * 2.5: # 如果标准差远大于预期的阴影衰落
+        if data["rssi_temporal_std_db"] > SHADOW_FADING_SIGMA_DB * 2.5: # 如果标准差远大于预期的阴影衰落
             # 进一步检查是否伴随不合理运动
-            if data["motion_state"] != "moving" or data["current_speed_mps"] < 0.1:
+            if data["motion_state"] != "moving" or (data["speed_valid"] and data["current_speed_mps"] < 0.1):
                 data["is_anomalous"] = True
                 data["anomaly_reason"] = "High RSSI Variance while Stationary"
                 return
         
         # A3. 运动学不一致性 (Kinematic Inconsistency)
-        if data["current_speed_mps"] > MAX_SPEED_METERS_PER_SEC * 1.2: # 超过最大合理速度较多
+        if data["speed_valid"] and data["current_speed_mps"] > MAX_SPEED_METERS_PER_SEC * 1.2: # 超过最大合理速度较多
             data["is_anomalous"] = True
             data["anomaly_reason"] = f"Implausible Speed: {data['current_speed_mps']:.1f} m/s"
             return
 
         # A4. RSSI 与运动状态严重不匹配
         # 例如：RSSI 持续很强但行人距离扫描仪很远，或 RSSI 变化与运动方向不符
-        # 这个规则比较复杂，需要更精细的位置估计和历史分析，此处简化
-        avg_current_rssi = np.mean(list(current_rssi_values.values())) if current_rssi_values else RSSI_VALID_RANGE_DBM[0]
+        # 距离使用RSSI定位得到的估计位置 (RSU 无法获得真实位置)
+        avg_current_rssi = sum(current_rssi_values.values()) / len(current_rssi_values) if current_rssi_values else RSSI_VALID_RANGE_DBM[0]
+        est_pos = data["est_pos"]
         estimated_distance_m_avg = 0
         num_scanners = 0
-        for sc_pos in self.scanner_configs.values():
-            estimated_distance_m_avg += math.sqrt((ped_object.pos[0]-sc_pos[0])**2 + (ped_object.pos[1]-sc_pos[1])**2) / PIXELS_PER_METER
+        for sc_id in current_rssi_values:
+            sc_pos = self.scanner_configs[sc_id]
+            estimated_distance_m_avg += math.sqrt((est_pos[0]-sc_pos[0])**2 + (est_pos[1]-sc_pos[1])**2) / PIXELS_PER_METER
             num_scanners += 1
         if num_scanners > 0: estimated_distance_m_avg /= num_scanners
 
@@ -137,15 +161,16 @@ class RSU:
         # 置信度评估
         if data["intent_prob"] > 0.1: # 只有当有一定意图概率时才计算置信度
             # C1: 基于RSSI强度 (相对于等待阈值)
-            conf_rssi = np.clip((data["avg_rssi_stable"] - RSSI_WAITING_THRESHOLD_DBM) * CONFIDENCE_FROM_RSSI_FACTOR, 0, 0.3)
+            # (标量用 min/max，np.clip 开销大)
+            conf_rssi = min(max((data["avg_rssi_stable"] - RSSI_WAITING_THRESHOLD_DBM) * CONFIDENCE_FROM_RSSI_FACTOR, 0), 0.3)
             
             # C2: 基于RSSI稳定性 (标准差越小，稳定性越高)
-            conf_stability = np.clip(CONFIDENCE_FROM_STABILITY_MAX * (1 - data["rssi_std_dev"] / (SHADOW_FADING_SIGMA_DB * 2)), 0, CONFIDENCE_FROM_STABILITY_MAX)
+            conf_stability = min(max(CONFIDENCE_FROM_STABILITY_MAX * (1 - data["rssi_std_dev"] / (SHADOW_FADING_SIGMA_DB * 2)), 0), CONFIDENCE_FROM_STABILITY_MAX)
 
             # C3: 基于高意图持续时间
-            conf_duration = np.clip((data["frames_high_intent"] / FPS) * 0.1, 0, CONFIDENCE_FROM_DURATION_MAX)
+            conf_duration = min(max((data["frames_high_intent"] / FPS) * 0.1, 0), CONFIDENCE_FROM_DURATION_MAX)
             
-            data["confidence"] = np.clip(conf_rssi + conf_stability + conf_duration, 0, 1.0)
+            data["confidence"] = min(max(conf_rssi + conf_stability + conf_duration, 0), 1.0)
 
             # 如果行人按了按钮，直接给予较高置信度（如果意图也存在）
             if ped_object.is_requesting_button_press and data["intent_prob"] > 0.5:
@@ -164,56 +189,178 @@ class RSU:
 
     def scan_and_process_pedestrians(self, all_pedestrians_list):
         """扫描所有行人，更新其追踪数据，执行PI-BPRV"""
-        current_detected_ids = set()
-        for ped_obj in all_pedestrians_list:
-            current_detected_ids.add(ped_obj.id)
-            if ped_obj.id not in self.pedestrian_tracking_data:
-                self.pedestrian_tracking_data[ped_obj.id] = {
-                    "rssi_per_scanner": {sc_id: deque(maxlen=int(FPS*2)) for sc_id in self.scanner_configs.keys()}, # 2秒RSSI历史
-                    "avg_rssi_stable": RSSI_VALID_RANGE_DBM[0],
-                    "rssi_std_dev": 0.0,
-                    "last_pos": ped_obj.pos,
-                    "current_speed_mps": 0.0,
-                    "motion_state": "moving",
-                    "is_at_wait_area": False,
-                    "is_anomalous": False,
-                    "anomaly_reason": "",
-                    "intent_prob": 0.0,
-                    "confidence": 0.0,
-                    "frames_high_intent": 0,
-                    "time_waiting_high_conf_sec": 0.0
-                }
-            
-            data = self.pedestrian_tracking_data[ped_obj.id]
-            data["last_pos"] = list(ped_obj.pos) # 存储副本
-            data["motion_state"] = ped_obj.motion_state
-            data["current_speed_mps"] = ped_obj.get_current_speed_mps()
-            data["is_at_wait_area"] = ped_obj.is_at_wait_area
-
-            current_rssi_this_frame = {}
-            all_historical_rssi_for_std_calc = []
-
-            for sc_id, sc_pos in self.scanner_configs.items():
-                rssi = self._simulate_rssi_value(ped_obj.ble_tx_power, ped_obj.pos, ped_obj.current_velocity, sc_pos)
-                data["rssi_per_scanner"][sc_id].append(rssi)
-                current_rssi_this_frame[sc_id] = rssi
-                all_historical_rssi_for_std_calc.extend(list(data["rssi_per_scanner"][sc_id]))
-            
-            if all_historical_rssi_for_std_calc:
-                data["avg_rssi_stable"] = np.mean(all_historical_rssi_for_std_calc)
-                data["rssi_std_dev"] = np.std(all_historical_rssi_for_std_calc)
-            else: # 避免空列表的均值/标准差计算
-                data["avg_rssi_stable"] = RSSI_VALID_RANGE_DBM[0]
-                data["rssi_std_dev"] = 0.0
-
-
+        self.track_manager.begin_frame()
+        detected_peds = [] # (ped_obj, 本帧RSSI)
+        rssi_matrix = np.empty((0, len(self.scanner_ids)))
+        tx_power = np.empty(0)
+        if all_pedestrians_list:
+            # 所有 (行人, 扫描仪) 对的距离一次算出；范围外的对不模拟，范围内的对按丢包概率漏收
+            ped_pos = np.array([ped_obj.pos for ped_obj in all_pedestrians_list], dtype=float).reshape(-1, 2)
+            all_tx_power = np.array([ped_obj.ble_tx_power for ped_obj in all_pedestrians_list], dtype=float)
+            distance_px = np.hypot(ped_pos[:, None, 0] - self.scanner_pos_px[None, :, 0], ped_pos[:, None, 1] - self.scanner_pos_px[None, :, 1])
+            in_range = distance_px <= self.max_scan_range_pixels
+            heard = in_range.copy()
+            heard[in_range] = np.random.random(int(in_range.sum())) >= BLE_PACKET_LOSS_PROBABILITY
+            all_rssi = np.full(distance_px.shape, np.nan) # 未收到的对为 NaN (定位器的输入格式)
+            all_rssi[heard] = self._simulate_rssi_values(np.broadcast_to(all_tx_power[:, None], heard.shape)[heard], distance_px[heard])
+
+            # 所有扫描仪都漏收的行人本帧未检测到，轨迹保持 (滑行) 直到超时
+            detected_rows = np.flatnonzero(heard.any(axis=1))
+            rssi_matrix = all_rssi[detected_rows]
+            tx_power = all_tx_power[detected_rows]
+            scanner_ids = self.scanner_ids
+            for row, rssi_row, reachable in zip(detected_rows.tolist(), rssi_matrix.tolist(), in_range[detected_rows].tolist()):
+                ped_obj = all_pedestrians_list[row]
+                current_rssi_this_frame = {sc_id: rssi for sc_id, rssi in zip(scanner_ids, rssi_row) if not math.isnan(rssi)}
+
+                data = self.track_manager.hit(ped_obj.id, self._new_track_data)
+                data["last_pos"] = list(ped_obj.pos) # 存储副本
+                data["motion_state"] = ped_obj.motion_state
+                data["current_rssi"] = current_rssi_this_frame
+                self._update_rssi_history(data, current_rssi_this_frame, reachable)
+                detected_peds.append((ped_obj, current_rssi_this_frame))
+
+        # 所有设备一次性批量定位，再用估计位置执行异常检测与意图推断
+        self._localize_detected_pedestrians(detected_peds, rssi_matrix, tx_power)
+        for ped_obj, current_rssi_this_frame in detected_peds:
             self._perform_physics_anomaly_detection(ped_obj.id, ped_obj, current_rssi_this_frame)
             self._infer_intent_and_confidence(ped_obj.id, ped_obj)
 
-        # 清理不再视野内的行人数据
-        ids_to_remove = set(self.pedestrian_tracking_data.keys()) - current_detected_ids
-        for id_rem in ids_to_remove:
-            del self.pedestrian_tracking_data[id_rem]
+        # 只处理到期的轨迹 (漏检超过 TTL)
+        self.track_manager.expire()
+
+    def _update_rssi_history(self, data, current_rssi_this_frame, reachable):
+        """
+        追加本帧RSSI到各扫描仪历史，并由滑动和与平方和更新 avg_rssi_stable、rssi_std_dev、rssi_temporal_std_db。
+        reachable: 按扫描仪列顺序，本帧各扫描仪是否在范围内；离开范围的扫描仪历史不再保留 (仅漏收一帧的扫描仪保留)。
+        """
+        rssi_per_scanner = data["rssi_per_scanner"]
+        rssi_sums = data["rssi_sums"]
+        for sc_id, rssi in current_rssi_this_frame.items():
+            rssi_hist = rssi_per_scanner.get(sc_id)
+            if rssi_hist is None:
+                rssi_hist = rssi_per_scanner[sc_id] = deque(maxlen=RSSI_HISTORY_FRAMES)
+                rssi_sums[sc_id] = [0.0, 0.0]
+            sums = rssi_sums[sc_id]
+            if len(rssi_hist) == rssi_hist.maxlen: # 最旧的读数滑出窗口
+                oldest = rssi_hist[0]
+                sums[0] -= oldest
+                sums[1] -= oldest * oldest
+            rssi_hist.append(rssi)
+            sums[0] += rssi
+            sums[1] += rssi * rssi
+        if len(rssi_per_scanner) > len(current_rssi_this_frame):
+            scanner_column = self.localizer.scanner_column
+            for sc_id in [k for k in rssi_per_scanner if not reachable[scanner_column[k]]]:
+                del rssi_per_scanner[sc_id]
+                del rssi_sums[sc_id]
+
+        # 全部读数的均值与标准差，以及各扫描仪相对各自均值的合并标准差 (时间上的不稳定性)。
+        # 全部读数的标准差还包含不同距离造成的均值差异，不能用来判断信号是否异常跳变。
+        # 合并标准差的自由度不足 RSSI_STABILITY_MIN_DOF 时为 0 (样本太少，不作判断)
+        count = total = total_sq = within_ss = 0.0
+        for sc_id, rssi_hist in rssi_per_scanner.items():
+            s, sq = rssi_sums[sc_id]
+            n = len(rssi_hist)
+            count += n
+            total += s
+            total_sq += sq
+            within_ss += sq - s * s / n
+        mean = total / count
+        data["avg_rssi_stable"] = mean
+        data["rssi_std_dev"] = math.sqrt(max(total_sq / count - mean * mean, 0.0))
+        dof = count - len(rssi_per_scanner)
+        data["rssi_temporal_std_db"] = math.sqrt(max(within_ss, 0.0) / dof) if dof >= RSSI_STABILITY_MIN_DOF else 0.0
+
+    @staticmethod
+    def _new_track_data():
+        return {
+            "rssi_per_scanner": {}, # 按需创建，仅保存范围内扫描仪的RSSI历史
+            "rssi_sums": {}, # 与 rssi_per_scanner 对应的滑动和与平方和
+            "avg_rssi_stable": RSSI_VALID_RANGE_DBM[0],
+            "rssi_std_dev": 0.0,
+            "rssi_temporal_std_db": 0.0, # 各扫描仪RSSI相对各自均值的标准差 (规则A2)
+            "last_pos": None,
+            "est_pos": None, # 首次定位前为空
+            "est_pos_cov": None,
+            "est_pos_frame": None,
+            "est_pos_history": deque(maxlen=LOCALIZATION_SPEED_WINDOW_FRAMES + 1),
+            "current_rssi": {},
+            "current_speed_mps": 0.0,
+            "speed_valid": False, # 速度估计是否可用 (定位已收敛且样本跨度足够)
+            "motion_state": "moving",
+            "is_at_wait_area": False,
+            "is_anomalous": False,
+            "anomaly_reason": "",
+            "intent_prob": 0.0,
+            "confidence": 0.0,
+            "frames_high_intent": 0,
+            "time_waiting_high_conf_sec": 0.0
+        }
+
+    def _localize_detected_pedestrians(self, detected_peds, rssi_matrix, tx_power):
+        """由 N×S RSSI 矩阵 (行与 detected_peds 对应，未收到为 NaN) 批量估计位置，并更新估计速度与等待区判断"""
+        num_peds = len(detected_peds)
+        if num_peds == 0:
+            return
+        prior_pos = np.full((num_peds, 2), np.nan)
+        prior_cov = np.zeros((num_peds, 2, 2))
+        prior_extra_var = np.zeros(num_peds) # 加到先验协方差对角线上的方差 (像素^2)
+        process_var = (LOCALIZATION_PROCESS_NOISE_METERS * PIXELS_PER_METER)**2
+        acquisition_var = (LOCALIZATION_ACQUISITION_NOISE_METERS * PIXELS_PER_METER)**2
+        frame = self.track_manager.frame
+        for row, (ped_obj, _) in enumerate(detected_peds):
+            data = self.pedestrian_tracking_data[ped_obj.id]
+            if data["est_pos"] is not None: # 用上一次估计热启动；滑行期间每漏检一帧增加一份过程噪声
+                prior_pos[row] = data["est_pos"]
+                prior_cov[row] = data["est_pos_cov"]
+                prior_extra_var[row] = (frame - data["est_pos_frame"] - 1) * process_var
+                if frame - data["first_seen_frame"] < LOCALIZATION_ACQUISITION_FRAMES: # 捕获期: 先验放宽，估计可以快速移向真实位置
+                    prior_extra_var[row] += acquisition_var
+        prior_cov += prior_extra_var[:, None, None] * np.eye(2)
+
+        est_pos, est_cov = self.localizer.localize(rssi_matrix, tx_power, prior_pos, prior_cov)
+
+        # 逐设备的标量量一次性算出，循环中只做字典更新
+        var_x = np.maximum(est_cov[:, 0, 0], 0.0)
+        var_y = np.maximum(est_cov[:, 1, 1], 0.0)
+        sigma_m = np.sqrt(np.maximum(var_x, var_y)) / PIXELS_PER_METER
+        # 等待区判断每侧允许 WAIT_AREA_TOLERANCE_SIGMA 个标准差的定位误差，避免估计在边界处抖动
+        tol_x = WAIT_AREA_TOLERANCE_SIGMA * np.sqrt(var_x)
+        tol_y = WAIT_AREA_TOLERANCE_SIGMA * np.sqrt(var_y)
+        at_wait = np.zeros(num_peds, dtype=bool)
+        for area in (WAIT_AREA_WEST, WAIT_AREA_EAST):
+            at_wait |= ((est_pos[:, 0] >= area.left - tol_x) & (est_pos[:, 0] < area.right + tol_x) &
+                        (est_pos[:, 1] >= area.top - tol_y) & (est_pos[:, 1] < area.bottom + tol_y))
+
+        for row, ((ped_obj, _), pos, pos_sigma_m, is_at_wait_area) in enumerate(zip(detected_peds, est_pos.tolist(), sigma_m.tolist(), at_wait.tolist())):
+            data = self.pedestrian_tracking_data[ped_obj.id]
+            pos = tuple(pos)
+            data["est_pos"] = pos
+            data["est_pos_cov"] = est_cov[row]
+            data["est_pos_frame"] = frame
+            data["is_at_wait_area"] = is_at_wait_area
+
+            # 速度: 估计位置在时间窗口内的平均位移速度 (按帧号计时，漏检的帧不会使速度偏大)。
+            # 新轨迹的估计要先收敛 (最初几帧可能相差十米以上，收敛过程中的位移会被误当作高速运动)，
+            # 因此预热期内或定位标准差过大的估计不进入历史；收敛样本未覆盖整个窗口时速度视为未知
+            history = data["est_pos_history"]
+            if frame - data["first_seen_frame"] < LOCALIZATION_SPEED_WARMUP_FRAMES or pos_sigma_m > LOCALIZATION_SPEED_MAX_SIGMA_METERS:
+                history.clear()
+            else:
+                history.append((frame, pos))
+            window_frames = history[-1][0] - history[0][0] if history else 0
+            data["speed_valid"] = window_frames >= LOCALIZATION_SPEED_WINDOW_FRAMES
+            if data["speed_valid"]:
+                dx = history[-1][1][0] - history[0][1][0]
+                dy = history[-1][1][1] - history[0][1][1]
+                data["current_speed_mps"] = math.sqrt(dx**2 + dy**2) / PIXELS_PER_METER / (window_frames / FPS)
+            else:
+                data["current_speed_mps"] = 0.0
+
+    def get_device_state(self, ped_id):
+        """单个设备的追踪状态 (与 EmbeddedRSU.get_device_state 接口一致)"""
+        return self.pedestrian_tracking_data.get(ped_id)
 
     def determine_signal_request_priority(self):
         """
@@ -222,10 +369,13 @@ class RSU:
         """
         highest_priority = 0
         request_reason = ""
+        request_ped_id = None
 
         for ped_id, data in self.pedestrian_tracking_data.items():
             if data["is_anomalous"]: # 忽略异常行人
                 continue
+            if data["track_state"] == TRACK_TENTATIVE: # 未确认的轨迹不发起请求；滑行中的轨迹保留其请求资格
+                continue
 
             ped_obj_ref = None # 需要一种方式获取原始ped_obj来检查按钮状态
             # (在实际应用中，按钮状态可能是单独的事件流，或通过ped_id关联)
@@ -244,6 +394,7 @@ class RSU:
                 if data["time_waiting_high_conf_sec"] >= TARGET_WAITING_TIME_BLE_HIGH_CONF:
                     highest_priority = 2
                     request_reason = f"BLE Ped {ped_id} (High Conf) waited {data['time_waiting_high_conf_sec']:.1f}s"
+                    request_ped_id = ped_id
                     break # 高置信度用户达到等待上限
             elif data["confidence"] >= CONFIDENCE_MEDIUM_THRESHOLD:
                 # 简化：中等置信度也用 time_waiting_high_conf_sec，但目标时间更长
@@ -251,7 +402,9 @@ class RSU:
                     if highest_priority < 2: # 只有当没有更高优先级请求时才考虑
                         highest_priority = max(highest_priority, 1)
                         request_reason = f"BLE Ped {ped_id} (Med Conf) waited {data['time_waiting_high_conf_sec']:.1f}s"
+                        request_ped_id = ped_id
         
+        self.last_request_ped_id = request_ped_id
         if highest_priority > 0:
              print(f"RSU: Signal request priority {highest_priority}. Reason: {request_reason}")
         return highest_priority
\ No newline at end of file
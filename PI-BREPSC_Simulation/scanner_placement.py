@@ -0,0 +1,235 @@
+# scanner_placement.py
+import math
+import multiprocessing
+import time
+import numpy as np
+from config import *
+from rsu_simulator import max_scan_range_meters
+
+def _normal_cdf(x):
+    """向量化标准正态分布函数 (Abramowitz-Stegun 7.1.26 近似 erf，误差 < 1.5e-7)"""
+    z = np.abs(x) / math.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+class CoverageModel:
+    """
+    扫描仪布局的覆盖分析。在等待区及其周边 (路过行人区域) 的像素网格上，用与仿真相同的信道参数
+    (对数距离路径损耗、阴影衰落、概率性人体遮挡、漏包) 解析计算每个格子的:
+      - 期望 RSSI (各扫描仪中最强者)
+      - 单帧检测概率 (至少一个扫描范围内的扫描仪收到高于有效下限的读数)
+      - 定位精度: 单帧 Fisher 信息的逆 (CRLB)，再按 RSU 定位器的随机游走先验求稳态方差
+      - 被判为 "在等待区等待" 的概率 (估计位置落入每侧按 WAIT_AREA_TOLERANCE_SIGMA 个 σ 放宽的等待区，且平均 RSSI 高于等待阈值)
+    意图可分性 = 等待区格子的判定率与路过区域格子的拒绝率的平均 (平衡准确率)。
+    所有计算对 (布局, 格子, 扫描仪) 批量向量化，一次评估多个布局。
+    """
+
+    def __init__(self, grid_step_px=None, roi_margin_m=None, tx_power_dbm=None):
+        if grid_step_px is None:
+            grid_step_px = COVERAGE_GRID_STEP_PIXELS
+        if roi_margin_m is None:
+            roi_margin_m = COVERAGE_ROI_MARGIN_METERS
+        if tx_power_dbm is None:
+            tx_power_dbm = DEFAULT_TX_POWER_DBM
+        self.tx_power_dbm = tx_power_dbm
+        self.max_scan_range_m = max_scan_range_meters() # 与 RSU 相同的扫描范围裁剪
+        margin_px = roi_margin_m * PIXELS_PER_METER
+        left = max(0, min(WAIT_AREA_WEST.left, WAIT_AREA_EAST.left) - margin_px)
+        right = min(SCREEN_WIDTH, max(WAIT_AREA_WEST.right, WAIT_AREA_EAST.right) + margin_px)
+        top = max(0, min(WAIT_AREA_WEST.top, WAIT_AREA_EAST.top) - margin_px)
+        bottom = min(SCREEN_HEIGHT, max(WAIT_AREA_WEST.bottom, WAIT_AREA_EAST.bottom) + margin_px)
+        # 格子中心 (像素)
+        self.grid_x = np.arange(left + grid_step_px / 2, right, grid_step_px)
+        self.grid_y = np.arange(top + grid_step_px / 2, bottom, grid_step_px)
+        gx, gy = np.meshgrid(self.grid_x, self.grid_y)
+        self.cells_px = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        self.cells_m = self.cells_px / PIXELS_PER_METER
+
+        def in_rect(rect):
+            return ((self.cells_px[:, 0] >= rect.left) & (self.cells_px[:, 0] < rect.right) &
+                    (self.cells_px[:, 1] >= rect.top) & (self.cells_px[:, 1] < rect.bottom))
+
+        self.wait_mask = in_rect(WAIT_AREA_WEST) | in_rect(WAIT_AREA_EAST)
+        self.passerby_mask = ~self.wait_mask & ~in_rect(V_ROAD_RECT) # 等待区周边的人行道
+        self._wait_rects_m = np.array([[r.left, r.right, r.top, r.bottom] for r in (WAIT_AREA_WEST, WAIT_AREA_EAST)],
+                                      dtype=float) / PIXELS_PER_METER
+
+        # 信道常数
+        self._k = 10 * PATH_LOSS_EXPONENT_N / math.log(10) # rssi = tx - k*ln(d/d0)
+        self._sigma_body = math.sqrt(SHADOW_FADING_SIGMA_DB**2 + BODY_SHADOWING_ATTENUATION_DB_STD**2)
+        self._meas_weight = 1.0 / LOCALIZATION_RSSI_SIGMA_DB**2
+        self._process_var_m2 = LOCALIZATION_PROCESS_NOISE_METERS**2
+
+    @property
+    def grid_shape(self):
+        return len(self.grid_y), len(self.grid_x)
+
+    def _prob_reading_above(self, mean_clear_dbm, level_dbm):
+        """P(单次读数 > level)：阴影衰落与概率性人体遮挡的混合分布"""
+        p = BODY_SHADOWING_PROBABILITY
+        return ((1 - p) * _normal_cdf((mean_clear_dbm - level_dbm) / SHADOW_FADING_SIGMA_DB) +
+                p * _normal_cdf((mean_clear_dbm - BODY_SHADOWING_ATTENUATION_DB_MEAN - level_dbm) / self._sigma_body))
+
+    def _analyze(self, layouts_m):
+        """layouts_m: (L,S,2) 扫描仪位置 (米)。返回各格子的中间量，形状 (L,G) 或 (L,G,...)"""
+        diff = self.cells_m[None, :, None, :] - layouts_m[:, None, :, :] # (L,G,S,2)
+        dist_sq = np.einsum('lgsi,lgsi->lgs', diff, diff)
+        in_range = dist_sq <= self.max_scan_range_m**2 # 与 RSU 的扫描范围裁剪一致：范围外的扫描仪收不到
+        beyond_d0 = dist_sq > PATH_LOSS_D0_METERS**2
+        dist_sq = np.maximum(dist_sq, PATH_LOSS_D0_METERS**2)
+        mean_clear = self.tx_power_dbm - self._k * 0.5 * np.log(dist_sq / PATH_LOSS_D0_METERS**2) # 无遮挡时的平均RSSI
+
+        low, high = RSSI_VALID_RANGE_DBM
+        p_above_floor = self._prob_reading_above(mean_clear, low)
+        p_unclipped = p_above_floor - self._prob_reading_above(mean_clear, high)
+        p_received = 1.0 - BLE_PACKET_LOSS_PROBABILITY
+        p_detect_scanner = np.where(in_range, p_received * p_above_floor, 0.0)
+        p_detect = 1.0 - np.prod(1.0 - p_detect_scanner, axis=2)
+
+        mean_rssi = np.clip(mean_clear - BODY_SHADOWING_PROBABILITY * BODY_SHADOWING_ATTENUATION_DB_MEAN, low, high)
+
+        # 单帧 Fisher 信息：与 RSSILocalizer 的权重一致 (截断读数权重降低)
+        weight = in_range * p_received * self._meas_weight * (p_unclipped + LOCALIZATION_CLIPPED_RSSI_WEIGHT * (1 - p_unclipped))
+        grad = np.where(beyond_d0[..., None], -self._k * diff / dist_sq[..., None], 0.0) # d(平均RSSI)/d(位置)
+        info = np.einsum('lgs,lgsi,lgsj->lgij', weight, grad, grad)
+        det = info[..., 0, 0] * info[..., 1, 1] - info[..., 0, 1] * info[..., 1, 0]
+        observable = det > 1e-12 # 范围内扫描仪不足时位置不可观测
+        det = np.maximum(det, 1e-12)
+        meas_var = np.stack([info[..., 1, 1] / det, info[..., 0, 0] / det], axis=-1) # 单帧 CRLB 对角线 (L,G,2)
+        meas_var = np.where(observable[..., None], np.minimum(meas_var, LOCALIZATION_INITIAL_SIGMA_METERS**2),
+                            LOCALIZATION_INITIAL_SIGMA_METERS**2)
+        # 随机游走先验下卡尔曼滤波的稳态方差: P = (-Q + sqrt(Q^2 + 4QR)) / 2
+        q = self._process_var_m2
+        loc_var = 0.5 * (-q + np.sqrt(q * q + 4 * q * meas_var))
+        loc_sigma = np.sqrt(loc_var)
+
+        # 估计位置落入 (每侧按 WAIT_AREA_TOLERANCE_SIGMA 个 σ 放宽的) 等待区的概率，与 RSU 的判断方式一致
+        cx = self.cells_m[None, :, 0]
+        cy = self.cells_m[None, :, 1]
+        sx = loc_sigma[..., 0]
+        sy = loc_sigma[..., 1]
+        k = WAIT_AREA_TOLERANCE_SIGMA
+        p_in_wait = np.zeros_like(cx * sx)
+        for x_lo, x_hi, y_lo, y_hi in self._wait_rects_m:
+            px = _normal_cdf((x_hi + k * sx - cx) / sx) - _normal_cdf((x_lo - k * sx - cx) / sx)
+            py = _normal_cdf((y_hi + k * sy - cy) / sy) - _normal_cdf((y_lo - k * sy - cy) / sy)
+            p_in_wait += px * py
+        p_in_wait = np.clip(p_in_wait, 0.0, 1.0)
+
+        # 平均 RSSI 高于等待阈值的概率 (RSSI 历史窗口内所有扫描仪读数的均值)
+        num_in_range = in_range.sum(axis=2)
+        num_samples = np.maximum(num_in_range, 1) * RSSI_HISTORY_FRAMES * p_received
+        avg_rssi = np.where(num_in_range > 0, (mean_rssi * in_range).sum(axis=2) / np.maximum(num_in_range, 1), low)
+        p_rssi_ok = _normal_cdf((avg_rssi - RSSI_WAITING_THRESHOLD_DBM) / (LOCALIZATION_RSSI_SIGMA_DB / np.sqrt(num_samples)))
+
+        return {
+            "expected_rssi_dbm": np.where(in_range, mean_rssi, low).max(axis=2),
+            "detection_prob": p_detect,
+            "localization_sigma_m": np.sqrt(loc_var.sum(axis=-1)),
+            "p_waiting": p_detect * p_in_wait * p_rssi_ok, # 被判为在等待区等待的概率
+        }
+
+    def evaluate(self, layouts_px):
+        """
+        批量评估布局。layouts_px: (L,S,2) 或 (S,2) 扫描仪像素坐标。
+        返回 dict，每项为 (L,) 数组: separability (平衡准确率), wait_accept, passerby_reject,
+        coverage (检测概率达标格子比例), mean_detection_prob, mean_localization_sigma_m。
+        """
+        layouts_m = np.asarray(layouts_px, dtype=float).reshape(-1, np.shape(layouts_px)[-2], 2) / PIXELS_PER_METER
+        maps = self._analyze(layouts_m)
+        p_waiting = maps["p_waiting"]
+        wait_accept = p_waiting[:, self.wait_mask].mean(axis=1)
+        passerby_reject = 1.0 - p_waiting[:, self.passerby_mask].mean(axis=1)
+        detection = maps["detection_prob"]
+        return {
+            "separability": 0.5 * (wait_accept + passerby_reject),
+            "wait_accept": wait_accept,
+            "passerby_reject": passerby_reject,
+            "coverage": (detection >= COVERAGE_MIN_DETECTION_PROBABILITY).mean(axis=1),
+            "mean_detection_prob": detection.mean(axis=1),
+            "mean_localization_sigma_m": maps["localization_sigma_m"][:, self.wait_mask | self.passerby_mask].mean(axis=1),
+        }
+
+    def coverage_maps(self, layout_px):
+        """单个布局的覆盖图，每项为 (行, 列) 网格，对应 grid_y × grid_x"""
+        maps = self._analyze(np.asarray(layout_px, dtype=float).reshape(1, -1, 2) / PIXELS_PER_METER)
+        return {name: values[0].reshape(self.grid_shape) for name, values in maps.items()}
+
+
+def candidate_sites(step_px=None, roi_margin_m=None):
+    """候选安装位置：分析区域内的规则网格 (像素)"""
+    if step_px is None:
+        step_px = COVERAGE_CANDIDATE_STEP_PIXELS
+    if roi_margin_m is None:
+        roi_margin_m = COVERAGE_ROI_MARGIN_METERS
+    margin_px = roi_margin_m * PIXELS_PER_METER
+    left = max(0, min(WAIT_AREA_WEST.left, WAIT_AREA_EAST.left) - margin_px)
+    right = min(SCREEN_WIDTH, max(WAIT_AREA_WEST.right, WAIT_AREA_EAST.right) + margin_px)
+    top = max(0, min(WAIT_AREA_WEST.top, WAIT_AREA_EAST.top) - margin_px)
+    bottom = min(SCREEN_HEIGHT, max(WAIT_AREA_WEST.bottom, WAIT_AREA_EAST.bottom) + margin_px)
+    xs, ys = np.meshgrid(np.arange(left, right + 1, step_px), np.arange(top, bottom + 1, step_px))
+    return np.stack([xs.ravel(), ys.ravel()], axis=1).astype(float)
+
+
+# --- 并行布局搜索 ---
+_worker_model = None
+
+def _init_worker():
+    global _worker_model
+    _worker_model = CoverageModel()
+
+def _search_chunk(args):
+    """工作进程：随机生成 num_layouts 个布局，分批评估，返回本块得分最高的 top_k 个"""
+    seed, num_layouts, num_scanners, sites, top_k = args
+    model = _worker_model if _worker_model is not None else CoverageModel()
+    rng = np.random.default_rng(seed)
+    best = [] # (得分, 布局, 指标)
+    for start in range(0, num_layouts, COVERAGE_SEARCH_BATCH):
+        batch = min(COVERAGE_SEARCH_BATCH, num_layouts - start)
+        # 每个布局从候选位置中不重复地选取 num_scanners 个
+        idx = np.argsort(rng.random((batch, len(sites))), axis=1)[:, :num_scanners]
+        layouts = sites[idx]
+        metrics = model.evaluate(layouts)
+        for i in np.argsort(-metrics["separability"])[:top_k]:
+            best.append((float(metrics["separability"][i]), layouts[i], {k: float(v[i]) for k, v in metrics.items()}))
+        best.sort(key=lambda item: -item[0])
+        del best[top_k:]
+    return best
+
+def search_layouts(num_layouts=None, num_scanners=None, seed=0, processes=None, top_k=5):
+    """
+    在候选安装位置上随机搜索扫描仪布局，按意图可分性排序 (并行)。
+    返回 (排名列表 [(布局像素坐标 (S,2), 指标 dict)], 当前 RSU_SCANNER_POSITIONS 的指标, 统计信息)。
+    """
+    baseline_layout = np.array(list(RSU_SCANNER_POSITIONS.values()), dtype=float)
+    if num_layouts is None:
+        num_layouts = COVERAGE_SEARCH_LAYOUTS
+    if num_scanners is None:
+        num_scanners = len(baseline_layout)
+    sites = candidate_sites()
+    processes = processes or multiprocessing.cpu_count()
+    num_chunks = max(1, processes * 4)
+    chunk_sizes = [num_layouts // num_chunks + (1 if i < num_layouts % num_chunks else 0) for i in range(num_chunks)]
+    tasks = [(seed * 100003 + i, size, num_scanners, sites, top_k) for i, size in enumerate(chunk_sizes) if size > 0]
+
+    t0 = time.perf_counter()
+    if processes > 1:
+        with multiprocessing.Pool(processes=processes, initializer=_init_worker) as pool:
+            chunk_results = pool.map(_search_chunk, tasks, chunksize=1)
+    else:
+        _init_worker()
+        chunk_results = [_search_chunk(task) for task in tasks]
+    elapsed = time.perf_counter() - t0
+
+    ranked = sorted((item for chunk in chunk_results for item in chunk), key=lambda item: -item[0])[:top_k]
+    baseline = {k: float(v[0]) for k, v in CoverageModel().evaluate(baseline_layout).items()}
+    stats = {
+        "layouts_evaluated": sum(chunk_sizes),
+        "candidate_sites": len(sites),
+        "elapsed_sec": elapsed,
+        "ms_per_layout": elapsed * 1000 / max(1, sum(chunk_sizes)),
+    }
+    return [(layout, metrics) for _, layout, metrics in ranked], baseline, stats
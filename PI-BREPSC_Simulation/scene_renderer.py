@@ -0,0 +1,171 @@
+# scene_renderer.py
+import pygame
+from config import *
+
+_font_cache = {}
+
+def get_font(size):
+    """按字号缓存字体对象 (每帧为每个行人重新加载字体开销很大)"""
+    font = _font_cache.get(size)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = _font_cache[size] = pygame.font.Font(DEFAULT_FONT_NAME, size)
+    return font
+
+def load_fonts():
+    return get_font(FONT_SIZE_SMALL), get_font(FONT_SIZE_MEDIUM), get_font(FONT_SIZE_LARGE)
+
+def draw_text(surface, text, pos, font, color=DARK_GREY, center_aligned=False):
+    text_surf = font.render(text, True, color)
+    text_rect = text_surf.get_rect()
+    if center_aligned:
+        text_rect.center = pos
+    else:
+        text_rect.topleft = pos
+    surface.blit(text_surf, text_rect)
+
+def render_scene(surface, sim, selected_pedestrian_id=None):
+    """
+    将当前仿真状态 (道路、人行横道、信号灯、行人、调试面板) 绘制到任意 pygame.Surface。
+    交互窗口与离屏导出 (frame_exporter.py) 共用；不需要显示设备。
+    """
+    font_s, font_m, font_l = load_fonts()
+    rsu_unit = sim.rsu_unit
+    tlc_unit = sim.tlc_unit
+    pedestrians_list = sim.pedestrians_list
+
+    surface.fill(LIGHT_BLUE) # Light blue background
+
+    # 绘制道路和人行横道
+    pygame.draw.rect(surface, DARK_GREY, V_ROAD_RECT) # Main road
+
+    # Draw crosswalk (multiple lines)
+    crosswalk_line_width = 8
+    crosswalk_spacing = 15
+    num_lines = int(H_CROSSWALK_RECT_NORTH.width // (crosswalk_line_width + crosswalk_spacing))
+
+    for i in range(num_lines):
+        x = H_CROSSWALK_RECT_NORTH.left + i * (crosswalk_line_width + crosswalk_spacing)
+        pygame.draw.rect(surface, WHITE, (x, H_CROSSWALK_RECT_NORTH.top, crosswalk_line_width, H_CROSSWALK_RECT_NORTH.height)) # 北
+        pygame.draw.rect(surface, WHITE, (x, H_CROSSWALK_RECT_SOUTH.top, crosswalk_line_width, H_CROSSWALK_RECT_SOUTH.height)) # 南
+
+    # Draw waiting area (schematic)
+    pygame.draw.rect(surface, (230,230,250), WAIT_AREA_WEST) # Light purple
+    pygame.draw.rect(surface, BLACK, WAIT_AREA_WEST,1)
+    draw_text(surface, "W_Area", (WAIT_AREA_WEST.centerx, WAIT_AREA_WEST.top + 5), font_s, BLACK, center_aligned=True)
+    pygame.draw.rect(surface, (230,250,230), WAIT_AREA_EAST) # Light green
+    pygame.draw.rect(surface, BLACK, WAIT_AREA_EAST,1)
+    draw_text(surface, "E_Area", (WAIT_AREA_EAST.centerx, WAIT_AREA_EAST.top + 5), font_s, BLACK, center_aligned=True)
+
+
+    # Draw vehicle traffic lights (below road)
+    v_light_base_x = V_ROAD_RECT.centerx
+    v_light_base_y = V_ROAD_RECT.bottom + 140 # Below road (5cm = 100 pixels + 40)
+    tlc_unit.draw(surface)
+
+    # Draw RSU scanner (on sidewalk)
+    rsu_scanner_radius = 7
+    rsu_color = (50,50,150)
+    draw_offset = 20
+    pygame.draw.circle(surface, rsu_color, (V_ROAD_RECT.left - draw_offset, H_CROSSWALK_RECT_NORTH.centery), rsu_scanner_radius) # 西
+    draw_text(surface, "W", (V_ROAD_RECT.left - draw_offset, H_CROSSWALK_RECT_NORTH.centery-15), font_s, rsu_color, center_aligned=True)
+    pygame.draw.circle(surface, rsu_color, (V_ROAD_RECT.right + draw_offset, H_CROSSWALK_RECT_NORTH.centery),rsu_scanner_radius) # 东
+    draw_text(surface, "E", (V_ROAD_RECT.right + draw_offset, H_CROSSWALK_RECT_NORTH.centery-15), font_s, rsu_color, center_aligned=True)
+    pygame.draw.circle(surface, rsu_color, (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_NORTH.top - draw_offset), rsu_scanner_radius) # 北
+    draw_text(surface, "N", (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_NORTH.top - draw_offset-15), font_s, rsu_color, center_aligned=True)
+    pygame.draw.circle(surface,  rsu_color, (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_SOUTH.bottom + draw_offset),rsu_scanner_radius) # 南
+    draw_text(surface, "S", (V_ROAD_RECT.centerx, H_CROSSWALK_RECT_SOUTH.bottom + draw_offset-15), font_s,rsu_color, center_aligned=True)
+
+    # 绘制行人
+    for ped in pedestrians_list:
+        ped_rsu_data = rsu_unit.pedestrian_tracking_data.get(ped.id)
+        ped.draw(surface, ped_rsu_data)
+
+    # 绘制车辆 (示例)
+    vehicle_width = 30
+    vehicle_height = 50
+    vehicle_color = (128, 0, 128)  # 紫色
+    vehicle_x = V_ROAD_RECT.centerx - vehicle_width // 2
+    vehicle_y1 = V_ROAD_RECT.top + 50
+    vehicle_y2 = V_ROAD_RECT.top + 150
+    vehicle_y3 = V_ROAD_RECT.top + 250
+
+    # 根据交通灯状态决定是否绘制车辆
+    v_colors, _, _ = tlc_unit.get_signal_display_info()
+    vehicle_speed = 2
+    if v_colors["green"] == GREEN: # 绿灯
+        vehicle_y1 += vehicle_speed # 车辆向下行驶
+        if vehicle_y1 > SCREEN_HEIGHT:
+            vehicle_y1 = V_ROAD_RECT.top + 50
+        vehicle_y2 += vehicle_speed
+        if vehicle_y2 > SCREEN_HEIGHT:
+            vehicle_y2 = V_ROAD_RECT.top + 150
+        vehicle_y3 += vehicle_speed
+        if vehicle_y3 > SCREEN_HEIGHT:
+            vehicle_y3 = V_ROAD_RECT.top + 250
+    else: # 红灯或黄灯
+        vehicle_y1 = V_ROAD_RECT.top + 50
+        vehicle_y2 = V_ROAD_RECT.top + 150
+        vehicle_y3 = V_ROAD_RECT.top + 250
+        draw_text(surface, "GO", (vehicle_x + vehicle_width // 2, vehicle_y1 + vehicle_height // 2), font_m, WHITE, center_aligned=True) # 更改STOP颜色
+    pygame.draw.rect(surface, vehicle_color, (vehicle_x, vehicle_y1, vehicle_width, vehicle_height), border_radius=5) # Draw stopped or moving vehicles
+    pygame.draw.rect(surface, vehicle_color, (vehicle_x, vehicle_y2, vehicle_width, vehicle_height), border_radius=5)
+    pygame.draw.rect(surface, vehicle_color, (vehicle_x, vehicle_y3, vehicle_width, vehicle_height), border_radius=5)
+
+    # --- Draw debug info panel ---
+    info_panel_x = 10
+    info_panel_y = 10
+    draw_text(surface, "PI-BREPSC Simulation", (info_panel_x, info_panel_y), font_m, BLACK)
+    info_panel_y += 30
+    draw_text(surface, f"Vehicle Light: {tlc_unit.vehicle_phase.upper()}", (info_panel_x, info_panel_y), font_s)
+    info_panel_y += 20
+    draw_text(surface, f"Pedestrian Light: {tlc_unit.pedestrian_phase.upper()}", (info_panel_x, info_panel_y), font_s)
+    info_panel_y += 20
+    if tlc_unit.is_pedestrian_request_servicing:
+         draw_text(surface, "Servicing Pedestrian Request...", (info_panel_x, info_panel_y), font_s, ORANGE)
+    info_panel_y += 20
+
+    info_panel_y += 10 # 分隔
+
+    if selected_pedestrian_id and selected_pedestrian_id in rsu_unit.pedestrian_tracking_data:
+        data = rsu_unit.pedestrian_tracking_data[selected_pedestrian_id]
+        ped_obj = next((p for p in pedestrians_list if p.id == selected_pedestrian_id), None)
+
+        draw_text(surface, f"Selected Pedestrian: {selected_pedestrian_id} ({rsu_unit.track_manager.state_of(data)})", (info_panel_x, info_panel_y), font_s, BLUE)
+        info_panel_y += 20
+        if ped_obj:
+            draw_text(surface, f"  Position: ({int(ped_obj.pos[0])},{int(ped_obj.pos[1])})", (info_panel_x, info_panel_y), font_s)
+            info_panel_y += 18
+            draw_text(surface, f"  Motion State: {data['motion_state']}", (info_panel_x, info_panel_y), font_s)
+            info_panel_y += 18
+            draw_text(surface, f"  Button Pressed: {ped_obj.is_requesting_button_press}", (info_panel_x, info_panel_y), font_s)
+            info_panel_y += 18
+            draw_text(surface, f"  Is Malicious: {ped_obj.is_malicious}", (info_panel_x, info_panel_y), font_s)
+            info_panel_y += 18
+        if data["est_pos"] is not None:
+            est_sigma_m = (data["est_pos_cov"][0][0] + data["est_pos_cov"][1][1]) ** 0.5 / PIXELS_PER_METER
+            draw_text(surface, f"  Est. Position: ({int(data['est_pos'][0])},{int(data['est_pos'][1])}) +/-{est_sigma_m:.1f}m", (info_panel_x, info_panel_y), font_s)
+            info_panel_y += 18
+
+        draw_text(surface, f"  Avg RSSI: {data['avg_rssi_stable']:.1f} dBm (Std: {data['rssi_std_dev']:.1f})", (info_panel_x, info_panel_y), font_s)
+        info_panel_y += 18
+        draw_text(surface, f"  Is Anomalous: {data['is_anomalous']} ({data['anomaly_reason']})", (info_panel_x, info_panel_y), font_s, RED if data['is_anomalous'] else BLACK)
+        info_panel_y += 18
+        draw_text(surface, f"  Intent Prob: {data['intent_prob']:.2f}", (info_panel_x, info_panel_y), font_s, BLACK)
+        info_panel_y += 18
+        draw_text(surface, f"  Confidence: {data['confidence']:.2f}", (info_panel_x, info_panel_y), font_s, BLACK)
+        info_panel_y += 18
+        draw_text(surface, f"  High Conf Waiting: {data['time_waiting_high_conf_sec']:.1f}s", (info_panel_x, info_panel_y), font_s)
+        info_panel_y += 25
+
+        # 显示每个扫描仪的RSSI值
+        draw_text(surface, "  Scanner RSSI:",(info_panel_x, info_panel_y), font_s)
+        info_panel_y +=18
+        for sc_id, rssi_hist in data["rssi_per_scanner"].items():
+            if rssi_hist:
+                draw_text(surface, f"    {sc_id}: {rssi_hist[-1]:.1f} dBm", (info_panel_x, info_panel_y), font_s)
+            info_panel_y += 18
+
+        draw_text(surface, "Controls: S/D=Spawn Ped, B=Button(Sel), M=Malicious(Sel),", (10, SCREEN_HEIGHT - 90), font_s, DARK_GREY)
+        draw_text(surface, "Click=Select, F5/F9=Save/Load Snapshot, ESC=Exit", (10, SCREEN_HEIGHT - 70), font_s, DARK_GREY)
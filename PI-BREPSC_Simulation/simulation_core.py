@@ -0,0 +1,200 @@
+# simulation_core.py
+import contextlib
+import os
+import random
+import sys
+import numpy as np
+from config import *
+from pedestrian_simulator import Pedestrian
+from rsu_simulator import RSU
+from traffic_light_controller import TrafficLightController
+from kpi_metrics import KPICollector
+from rsu_embedded_profile import EmbeddedProfileComparator
+from crowd_motion import plan_crowd_velocities, prepare_flow_fields
+
+class Simulation:
+    """
+    仿真的全部可变状态 (RSU、TLC、行人、KPI) 及逐帧更新逻辑，不依赖显示。
+    main_simulation.py 负责事件处理与绘图；快照/分支 (simulation_snapshot.py) 直接序列化本对象。
+    """
+
+    def __init__(self, scenario=None):
+        self.scenario = dict(DEFAULT_SCENARIO, **(scenario or {}))
+        self.rsu_unit = RSU(rsu_id="Intersection_RSU1", scanner_configs_dict=RSU_SCANNER_POSITIONS)
+        self.tlc_unit = TrafficLightController()
+        self.kpi_collector = KPICollector()
+        self.embedded_comparator = EmbeddedProfileComparator(self.rsu_unit) if RSU_EMBEDDED_PROFILE else None
+        self.pedestrians_list = []
+        self.ped_id_counter = 1
+        self.frame = 0
+        self.last_request_priority = 0 # 本帧驱动TLC的请求优先级 (记录轨迹用)
+        prepare_flow_fields() # 流场只依赖布局，在第一帧之前构建
+
+    def spawn_pedestrian(self, side="west", y_offset=0):
+        """Spawns a pedestrian in the sidewalk area on the specified side and plans a path."""
+        start_y = random.randint(int(H_CROSSWALK_RECT_NORTH.centery - ROAD_WIDTH*0.8),
+                                 int(H_CROSSWALK_RECT_SOUTH.centery + ROAD_WIDTH*0.8)) + y_offset
+
+        if side == "west":
+            start_x = WAIT_AREA_WEST.left + PEDESTRIAN_RADIUS + 5
+            target_wait_x = WAIT_AREA_WEST.right - PEDESTRIAN_RADIUS - 10
+            target_wait_area_key = "WAIT_AREA_WEST"
+            color = BLUE
+        else: # east
+            start_x = WAIT_AREA_EAST.right - PEDESTRIAN_RADIUS - 5
+            target_wait_x = WAIT_AREA_EAST.left + PEDESTRIAN_RADIUS + 10
+            target_wait_area_key = "WAIT_AREA_EAST"
+            color = (0,100,200) # 深蓝
+
+        ped = Pedestrian(id_num=self.ped_id_counter, start_pos=(start_x, start_y), color=color, target_wait_area_key=target_wait_area_key)
+        ped.set_path_to_point((target_wait_x, start_y)) # 移动到等待区边缘
+        if self.scenario["malicious_fraction"] > 0:
+            ped.is_malicious = random.random() < self.scenario["malicious_fraction"]
+        self.pedestrians_list.append(ped)
+        self.ped_id_counter += 1
+        return ped
+
+    def spawn_initial_pedestrians(self):
+        """按场景生成初始行人 (默认: 西侧2人)"""
+        for i in range(self.scenario["initial_west"]):
+            self.spawn_pedestrian("west", y_offset=-20 if i % 2 == 0 else 20)
+        for i in range(self.scenario["initial_east"]):
+            self.spawn_pedestrian("east", y_offset=-20 if i % 2 == 0 else 20)
+
+    def step(self):
+        """推进一帧"""
+        spawn_interval_frames = int(self.scenario["spawn_interval_sec"] * FPS)
+        if spawn_interval_frames > 0 and self.frame > 0 and self.frame % spawn_interval_frames == 0:
+            self.spawn_pedestrian(random.choice(("west", "east")), y_offset=random.randint(-20, 20))
+
+        pedestrians_list = self.pedestrians_list
+        for ped, velocity in zip(pedestrians_list, plan_crowd_velocities(pedestrians_list)):
+            ped.update(velocity)
+            # 自动请求过马路
+            if ped.is_at_wait_area and not ped.is_requesting_button_press:
+                ped.is_requesting_button_press = True
+                print(f"{ped.id} auto button press")
+
+        self.rsu_unit.scan_and_process_pedestrians(pedestrians_list)
+        rsu_request_priority = self.rsu_unit.determine_signal_request_priority()
+        request_source = self.rsu_unit
+        if self.embedded_comparator: # 嵌入式模式：由嵌入式流程的决策驱动TLC
+            rsu_request_priority = self.embedded_comparator.observe_frame(pedestrians_list, rsu_request_priority)
+            request_source = self.embedded_comparator.embedded_rsu
+        self.last_request_priority = rsu_request_priority
+        self.tlc_unit.update(rsu_request_priority)
+        self.kpi_collector.observe_frame(pedestrians_list, self.rsu_unit, self.tlc_unit, rsu_request_priority, request_source)
+
+        # Pedestrian crossing logic (simplified)
+        if self.tlc_unit.pedestrian_phase == "walk":
+            for ped in pedestrians_list:
+                if ped.is_at_wait_area:
+                    # 沿流场经人行横道走到对面的等待区域
+                    if ped.target_wait_area_key == "WAIT_AREA_WEST":
+                        ped.target_wait_area_key = "WAIT_AREA_EAST"
+                    else:
+                        ped.target_wait_area_key = "WAIT_AREA_WEST"
+                    ped.set_flow_destination(ped.target_wait_area_key)
+                    ped.is_requesting_button_press = False # 完成过马路后重置
+
+        self.frame += 1
+
+    def find_pedestrian(self, ped_id):
+        return next((p for p in self.pedestrians_list if p.id == ped_id), None)
+
+
+@contextlib.contextmanager
+def quiet_stdout(enabled=True):
+    """丢弃仿真模块的 print 输出 (长时间无界面运行时不在内存中积累)"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def seed_everything(seed):
+    """设置 random 与 numpy 的全局随机数种子"""
+    random.seed(seed)
+    np.random.seed(seed)
+
+# 仿真对象在构造时读取 (之后不再读取) 的参数。从快照继续运行时，已恢复的对象看不到对它们的覆盖
+CONSTRUCTION_TIME_PARAMETERS = frozenset({
+    # RSU: 扫描范围、逐轨迹历史长度
+    "RSU_SCANNER_RANGE_METERS", "RSU_RANGE_FADING_MARGIN_DB", "RSSI_HISTORY_FRAMES", "LOCALIZATION_SPEED_WINDOW_FRAMES",
+    # RSSILocalizer: 信道模型常数
+    "PIXELS_PER_METER", "PATH_LOSS_EXPONENT_N", "BODY_SHADOWING_PROBABILITY", "BODY_SHADOWING_ATTENUATION_DB_MEAN",
+    "LOCALIZATION_RSSI_SIGMA_DB",
+    # TrackManager
+    "TRACK_CONFIRM_HITS", "TRACK_TENTATIVE_TTL_FRAMES", "TRACK_COAST_TTL_FRAMES",
+    # KPICollector
+    "KPI_REPORT_INTERVAL_FRAMES", "KPI_HISTOGRAM_BINS", "KPI_WAIT_TIME_HIST_MAX_SEC",
+    # 嵌入式流程 (固定容量状态表)
+    "RSU_EMBEDDED_PROFILE", "EMBEDDED_MAX_TRACKED_DEVICES", "EMBEDDED_RSSI_WINDOW_FRAMES", "EMBEDDED_SPEED_WINDOW_FRAMES",
+    # 行人与流场
+    "PEDESTRIAN_RADIUS", "PEDESTRIAN_HISTORY_SIZE", "CROWD_FLOW_CELL_PIXELS", "CROWD_OFF_ROUTE_COST",
+})
+
+def check_snapshot_overrides(overrides):
+    """从快照继续运行前调用：覆盖构造时参数会被已恢复的对象忽略，因此报错而不是静默地运行另一组参数"""
+    fixed = sorted(set(overrides) & CONSTRUCTION_TIME_PARAMETERS)
+    if fixed:
+        raise ValueError(f"Cannot override {', '.join(fixed)} when continuing from a snapshot: "
+                         "the restored simulation objects were built with the snapshot's values")
+
+def apply_config_overrides(overrides):
+    """
+    覆盖 config.py 中的常量，例如 {"CONFIDENCE_HIGH_THRESHOLD": 0.8}；返回被覆盖前的值，可再次传入以还原。
+    各仿真模块通过 `from config import *` 持有常量副本，因此同时更新这些模块中的同名全局变量。
+    构造参数的默认值为 None 并在构造时读取这些全局变量，因此覆盖对之后新建的对象生效
+    (已构造的对象见 CONSTRUCTION_TIME_PARAMETERS)。
+    由其它常量推导出的值 (如 MIN_VEHICLE_GREEN_TIME 依赖 FPS) 不会自动重新计算。
+    """
+    import config
+    sim_dir = os.path.dirname(os.path.abspath(config.__file__))
+    previous = {}
+    for name, value in overrides.items():
+        if not hasattr(config, name):
+            raise KeyError(f"Unknown config parameter: {name}")
+        old_value = getattr(config, name)
+        previous[name] = old_value
+        for module in list(sys.modules.values()):
+            module_file = getattr(module, "__file__", None)
+            if not module_file or os.path.dirname(os.path.abspath(module_file)) != sim_dir:
+                continue
+            if module.__dict__.get(name, None) is old_value:
+                setattr(module, name, value)
+    return previous
+
+def run_headless(num_frames, seed=None, scenario=None, overrides=None, snapshot_path=None, quiet=True, frame_callback=None):
+    """
+    无界面运行仿真 (不导入 pygame)，返回结束时的 Simulation。
+    overrides 只在本次运行期间生效；snapshot_path 指定时从快照继续而非新建场景。
+    frame_callback(sim) 在每帧之后调用 (例如记录轨迹)。
+    """
+    if snapshot_path:
+        check_snapshot_overrides(overrides or {})
+    previous = apply_config_overrides(overrides or {})
+    try:
+        if snapshot_path:
+            from simulation_snapshot import load_snapshot
+            sim = load_snapshot(snapshot_path)
+        else:
+            if seed is not None:
+                seed_everything(seed)
+            sim = Simulation(scenario)
+            sim.spawn_initial_pedestrians()
+        if snapshot_path and seed is not None:
+            seed_everything(seed)
+        with quiet_stdout(quiet):
+            for _ in range(num_frames):
+                sim.step()
+                if frame_callback:
+                    frame_callback(sim)
+        return sim
+    finally:
+        apply_config_overrides(previous)
+
+def run_headless_summary(run_params):
+    """参数扫描的工作函数：run_params 为 run_headless 的关键字参数，返回 (run_params, KPI 摘要)"""
+    sim = run_headless(**run_params)
+    return run_params, sim.kpi_collector.summary()
@@ -0,0 +1,121 @@
+# simulation_snapshot.py
+import multiprocessing
+import pickle
+import random
+import zlib
+import numpy as np
+from config import *
+from simulation_core import apply_config_overrides, check_snapshot_overrides, quiet_stdout, seed_everything
+from crowd_motion import prepare_flow_fields
+
+SNAPSHOT_FORMAT_VERSION = 2 # 2: RSU 轨迹数据增加 rssi_sums
+_SNAPSHOT_MAGIC = b"PIBSNAP"
+
+def take_snapshot(sim):
+    """将完整仿真状态 (含 random / numpy 随机数状态) 序列化为压缩的二进制快照"""
+    state = {
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "sim": sim,
+        "random_state": random.getstate(),
+        "np_random_state": np.random.get_state(),
+    }
+    return _SNAPSHOT_MAGIC + zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), SNAPSHOT_COMPRESSION_LEVEL)
+
+def restore_snapshot(blob):
+    """
+    从快照恢复仿真对象，并恢复全局随机数状态；返回 Simulation。
+    快照是 pickle，反序列化可以执行任意代码：只加载自己生成的 (可信的) 快照文件。
+    文件头不符或内容损坏时抛出 ValueError。
+    """
+    if not blob.startswith(_SNAPSHOT_MAGIC):
+        raise ValueError("Not a PI-BREPSC simulation snapshot (bad header)")
+    try:
+        state = pickle.loads(zlib.decompress(blob[len(_SNAPSHOT_MAGIC):]))
+    except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        raise ValueError(f"Corrupt or truncated snapshot: {e}") from None
+    if not isinstance(state, dict) or state.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {state.get('version') if isinstance(state, dict) else None}")
+    random.setstate(state["random_state"])
+    np.random.set_state(state["np_random_state"])
+    prepare_flow_fields() # 流场不在快照中，新进程中恢复时重新构建
+    return state["sim"]
+
+def save_snapshot(sim, path):
+    with open(path, "wb") as f:
+        f.write(take_snapshot(sim))
+
+def load_snapshot(path):
+    """从文件恢复快照 (见 restore_snapshot)；文件不存在时抛出 FileNotFoundError，不是快照时抛出 ValueError"""
+    with open(path, "rb") as f:
+        blob = f.read()
+    try:
+        return restore_snapshot(blob)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+
+
+# --- 分支 (fork) ---
+# fork 启动方式下，子进程以写时复制方式继承父进程中已恢复的仿真对象，无需重新反序列化
+_fork_parent_sim = None
+_fork_parent_rng = None
+
+def _run_branch(args):
+    snapshot_blob, overrides, num_frames, seed, quiet = args
+    if snapshot_blob is None: # fork: 直接使用继承的对象 (写时复制)
+        sim = _fork_parent_sim
+        random.setstate(_fork_parent_rng[0])
+        np.random.set_state(_fork_parent_rng[1])
+    else: # spawn: 从快照恢复
+        sim = restore_snapshot(snapshot_blob)
+
+    apply_config_overrides(overrides)
+    if seed is not None:
+        seed_everything(seed)
+
+    with quiet_stdout(quiet):
+        for _ in range(num_frames):
+            sim.step()
+    return {
+        "overrides": overrides,
+        "seed": seed,
+        "final_frame": sim.frame,
+        "kpi": sim.kpi_collector.summary(),
+    }
+
+def fork_simulations(snapshot_blob, branch_overrides, num_frames, seeds=None, processes=None, quiet=True):
+    """
+    从同一快照并行派生多个分支，每个分支应用一组 config 覆盖 (如 {"CONFIDENCE_HIGH_THRESHOLD": 0.8})
+    并继续运行 num_frames 帧，返回每个分支的 KPI 摘要列表 (顺序与 branch_overrides 相同)。
+    seeds 为 None 时所有分支共享快照中的随机数状态 (公共随机数，便于对比参数)。
+    在支持 fork 的平台上使用写时复制的 fork 启动子进程，否则退化为 spawn 并在子进程中反序列化快照。
+    构造时读取的参数 (simulation_core.CONSTRUCTION_TIME_PARAMETERS) 在分支中无法改变，覆盖它们会报错。
+    """
+    global _fork_parent_sim, _fork_parent_rng
+    if not branch_overrides:
+        return []
+    seeds = seeds if seeds is not None else [None] * len(branch_overrides)
+    if len(seeds) != len(branch_overrides):
+        raise ValueError("seeds must have one entry per branch")
+    for overrides in branch_overrides:
+        check_snapshot_overrides(overrides)
+
+    use_fork = "fork" in multiprocessing.get_all_start_methods()
+    if use_fork:
+        saved_rng = (random.getstate(), np.random.get_state())
+        _fork_parent_sim = restore_snapshot(snapshot_blob) # 父进程中只反序列化一次
+        _fork_parent_rng = (random.getstate(), np.random.get_state())
+        random.setstate(saved_rng[0])
+        np.random.set_state(saved_rng[1])
+        context = multiprocessing.get_context("fork")
+        tasks = [(None, overrides, num_frames, seed, quiet) for overrides, seed in zip(branch_overrides, seeds)]
+    else:
+        context = multiprocessing.get_context("spawn")
+        tasks = [(snapshot_blob, overrides, num_frames, seed, quiet) for overrides, seed in zip(branch_overrides, seeds)]
+
+    try:
+        # 每个子进程只运行一个分支，保证分支之间互不影响 (config 覆盖是进程内全局的)
+        with context.Pool(processes=processes or min(len(tasks), multiprocessing.cpu_count()), maxtasksperchild=1) as pool:
+            return pool.map(_run_branch, tasks, chunksize=1)
+    finally:
+        _fork_parent_sim = None
+        _fork_parent_rng = None
@@ -0,0 +1,45 @@
+# spatial_grid.py
+import numpy as np
+
+
+def neighbor_pairs(positions, radius):
+    """
+    批量邻域查询 (NumPy)：返回距离小于 radius 的所有有序点对 (i, j)，i != j。
+    以 radius 为格子大小分桶，每个点只与 3×3 邻近格子中的点比较，密度有界时开销为 O(N)。
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    n = len(positions)
+    if n < 2:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    cells = np.floor(positions / radius).astype(np.int64)
+    cells -= cells.min(axis=0)
+    stride = int(cells[:, 1].max()) + 3 # 留出 ±1 的邻格偏移
+    keys = (cells[:, 0] + 1) * stride + (cells[:, 1] + 1)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    pair_i = []
+    pair_j = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbor_keys = keys + dx * stride + dy
+            start = np.searchsorted(sorted_keys, neighbor_keys, side="left")
+            counts = np.searchsorted(sorted_keys, neighbor_keys, side="right") - start
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # 展开每个点在该邻格中的所有候选 (变长区间拼接)
+            i_idx = np.repeat(np.arange(n), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            j_idx = order[np.repeat(start, counts) + offsets]
+            pair_i.append(i_idx)
+            pair_j.append(j_idx)
+    if not pair_i:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    i_idx = np.concatenate(pair_i)
+    j_idx = np.concatenate(pair_j)
+    diff = positions[i_idx] - positions[j_idx]
+    close = (i_idx != j_idx) & (np.einsum('ij,ij->i', diff, diff) < radius * radius)
+    return i_idx[close], j_idx[close]
@@ -0,0 +1,81 @@
+# track_manager.py
+import heapq
+from config import *
+
+TRACK_TENTATIVE = "tentative"
+TRACK_CONFIRMED = "confirmed"
+TRACK_COASTING = "coasting"
+
+class TrackManager:
+    """
+    RSU 轨迹生命周期管理：暂定 -> 确认 -> (漏检时) 滑行 -> 超时删除。
+    每条轨迹在最小堆中最多只有一个到期项；到期项弹出时若轨迹期间又被检测到，则按最后检测帧重新入堆，
+    否则删除。因此每帧的开销只与本帧检测到的设备和到期的设备有关，不需要重建全部轨迹的集合。
+    滑行中的轨迹保留 RSSI 历史、意图与置信度，短暂漏收后无需重新积累。
+    """
+
+    def __init__(self, confirm_hits=None, tentative_ttl_frames=None, coast_ttl_frames=None):
+        if confirm_hits is None:
+            confirm_hits = TRACK_CONFIRM_HITS
+        if tentative_ttl_frames is None:
+            tentative_ttl_frames = TRACK_TENTATIVE_TTL_FRAMES
+        if coast_ttl_frames is None:
+            coast_ttl_frames = TRACK_COAST_TTL_FRAMES
+        self.confirm_hits = confirm_hits
+        self.tentative_ttl_frames = tentative_ttl_frames
+        self.coast_ttl_frames = coast_ttl_frames
+        self.tracks = {} # track_id -> 轨迹数据 (dict)
+        self.frame = 0
+        self._expiry_heap = [] # (到期帧, track_id)
+        self.expired_count = 0
+        self.reacquired_count = 0 # 滑行轨迹在超时前被重新检测到的次数
+
+    def begin_frame(self):
+        self.frame += 1
+
+    def hit(self, track_id, create_track_data):
+        """本帧检测到设备：必要时用 create_track_data() 新建暂定轨迹，更新生命周期并返回轨迹数据"""
+        data = self.tracks.get(track_id)
+        if data is None:
+            data = self.tracks[track_id] = create_track_data()
+            data["track_state"] = TRACK_TENTATIVE
+            data["track_hits"] = 0
+            data["first_seen_frame"] = self.frame
+            heapq.heappush(self._expiry_heap, (self.frame + self.tentative_ttl_frames, track_id))
+        elif data["track_state"] == TRACK_CONFIRMED and data["last_seen_frame"] < self.frame - 1: # 滑行后重新检测到
+            self.reacquired_count += 1
+        data["last_seen_frame"] = self.frame
+        data["track_hits"] += 1
+        if data["track_state"] == TRACK_TENTATIVE and data["track_hits"] >= self.confirm_hits:
+            data["track_state"] = TRACK_CONFIRMED
+        return data
+
+    def state_of(self, data):
+        """暂定 / 确认 / 滑行 (确认轨迹本帧未检测到)"""
+        if data["track_state"] == TRACK_CONFIRMED and data["last_seen_frame"] < self.frame:
+            return TRACK_COASTING
+        return data["track_state"]
+
+    def is_seen_this_frame(self, data):
+        return data["last_seen_frame"] == self.frame
+
+    def _ttl_of(self, data):
+        return self.coast_ttl_frames if data["track_state"] == TRACK_CONFIRMED else self.tentative_ttl_frames
+
+    def expire(self):
+        """删除漏检超过 TTL 的轨迹，返回被删除的 track_id 列表"""
+        removed = []
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= self.frame:
+            _, track_id = heapq.heappop(heap)
+            data = self.tracks.get(track_id)
+            if data is None:
+                continue
+            expires_at = data["last_seen_frame"] + self._ttl_of(data)
+            if expires_at <= self.frame:
+                del self.tracks[track_id]
+                removed.append(track_id)
+            else: # 期间被检测到过，按最后检测时间重新安排
+                heapq.heappush(heap, (expires_at, track_id))
+        self.expired_count += len(removed)
+        return removed
@@ -1,5 +1,4 @@
 # traffic_light_controller.py
-import pygame
 from config import *
 
 class TrafficLightController:
@@ -106,8 +105,8 @@ class TrafficLightController:
             p_text_color = GREEN
         elif self.pedestrian_phase == "flash":
             p_display_text = "DONT WALK"
-            # 闪烁效果 (每半秒切换颜色)
-            if (pygame.time.get_ticks() // 500) % 2 == 0:
+            # 闪烁效果 (每半秒切换颜色)，按仿真帧计时，离屏导出时与仿真时间同步
+            if (self.current_phase_timer // (FPS // 2)) % 2 == 0:
                 p_text_color = RED
             else:
                 p_text_color = DARK_GREY # 或 ORANGE
@@ -115,6 +114,8 @@ class TrafficLightController:
         return v_light_colors, p_display_text, p_text_color
 
     def draw(self, screen):
+        import pygame # 仅绘图时需要
+        from scene_renderer import get_font
         v_colors, p_text, p_color = self.get_signal_display_info()
         
         # 绘制车辆信号灯 (示例位置)
@@ -125,7 +126,7 @@ class TrafficLightController:
         pygame.draw.circle(screen, v_colors["green"], (v_light_base_x, v_light_base_y + 30), 12)
 
         # 绘制行人信号文本 (示例位置)
-        p_font = pygame.font.Font(DEFAULT_FONT_NAME, FONT_SIZE_MEDIUM)
+        p_font = get_font(FONT_SIZE_MEDIUM)
         p_surface = p_font.render(p_text, True, p_color)
         p_rect = p_surface.get_rect(center=(V_ROAD_RECT.right + 50, INTERSECTION_CENTER_Y - 50))
         pygame.draw.rect(screen, BLACK, p_rect.inflate(10,5)) # 背景框
@@ -1,4 +1,3 @@
-import pygame
 import random
 from config import *
 
@@ -25,4 +24,5 @@ class Vehicle:
                 self.pos[1] = -self.height
 
     def draw(self, screen):
+        import pygame # 仅绘图时需要
         pygame.draw.rect(screen, self.color, (int(self.pos[0]), int(self.pos[1]), self.width, self.height))
\ No newline at end of file